@@ -0,0 +1,255 @@
+import argparse
+import csv
+import sys
+from datetime import date
+
+from db.connection import connect_db, close_db, close_pool
+from db.schema import migrate
+from modules.category import warm_category_cache
+from modules.expense import add_expenses, update_expenses, delete_expenses, iter_expenses
+from modules.importer import import_expenses, parse_amount
+from modules.report import totals_by_category, totals_by_month, range_summary, top_descriptions, print_table
+
+# python cli.py <command> --help for the options of each command
+EXAMPLES = """
+examples:
+  python cli.py add --amount 12.50 --category Food --date 2025-01-03 --description Lunch
+  python cli.py add --file statement.csv
+  python cli.py list --from 2025-01-01 --to 2025-01-31 --category Food
+  python cli.py update 41 42 43 --category Travel
+  python cli.py update --file fixes.csv
+  python cli.py delete 41 42 43
+  cat ids.txt | python cli.py delete --file -
+  python cli.py report category --from 2025-01-01
+"""
+
+
+# ------------------ ARGUMENT TYPES ------------------
+def amount_type(text):
+    # Same rules as imported rows
+    try:
+        return parse_amount(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def date_type(text):
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date {text!r}, expected YYYY-MM-DD")
+
+
+def open_input(path):
+    return sys.stdin if path == "-" else open(path, newline="", encoding="utf-8-sig")
+
+
+def read_ids(path):
+    # Expense ids separated by newlines, commas or spaces
+    f = open_input(path)
+    try:
+        return [int(value) for line in f for value in line.replace(",", " ").split()]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def read_updates(path):
+    # CSV with an id column plus any of amount, category, date, description;
+    # empty cells keep the current value
+    updates = []
+    f = open_input(path)
+    try:
+        reader = csv.DictReader(f)
+        for row in reader:
+            try:
+                amount = (row.get("amount") or "").strip()
+                category = (row.get("category") or "").strip()
+                when = (row.get("date") or "").strip()
+                description = row.get("description")
+                updates.append((
+                    int(row["id"]),
+                    amount_type(amount) if amount else None,
+                    category or None,
+                    date_type(when) if when else None,
+                    description if description else None,
+                ))
+            except (KeyError, TypeError, ValueError, argparse.ArgumentTypeError) as e:
+                raise ValueError(f"line {reader.line_num}: {e}")
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    return updates
+
+
+# ------------------ COMMANDS ------------------
+def cmd_add(args):
+    if args.file:
+        return 0 if import_expenses(args.file) else 1
+
+    if args.amount is None or not args.category or args.date is None:
+        print("add needs --amount, --category and --date (or --file)")
+        return 2
+
+    new_ids = add_expenses([(args.amount, args.category, args.date, args.description or "")])
+    if new_ids is None:
+        return 1
+    print(f"Expense added successfully! ID: {new_ids[0]}")
+    return 0
+
+
+def cmd_list(args):
+    connection = connect_db()
+    if not connection:
+        return 1
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["id", "amount", "category", "date", "description"])
+
+    try:
+        rows = iter_expenses(connection, args.after_id, args.limit, args.date_from, args.date_to, args.category)
+        for row in rows:
+            writer.writerow(row)
+        connection.commit()
+        return 0
+
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    finally:
+        close_db(connection)
+
+
+def cmd_update(args):
+    try:
+        updates = read_updates(args.file) if args.file else []
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 2
+
+    # The same change for every id given on the command line
+    changes = (args.amount, args.category, args.date, args.description)
+    if args.ids:
+        if all(change is None for change in changes):
+            print("Nothing to change: give --amount, --category, --date or --description")
+            return 2
+        updates.extend((expense_id,) + changes for expense_id in args.ids)
+
+    if not updates:
+        print("No expenses given")
+        return 2
+
+    updated = update_expenses(updates)
+    if updated is None:
+        return 1
+    return report_missing("updated", [update[0] for update in updates], updated)
+
+
+def cmd_delete(args):
+    try:
+        expense_ids = list(args.ids) + (read_ids(args.file) if args.file else [])
+    except ValueError as e:
+        print(f"Error: invalid id ({e})")
+        return 2
+
+    if not expense_ids:
+        print("No expenses given")
+        return 2
+
+    deleted = delete_expenses(expense_ids)
+    if deleted is None:
+        return 1
+    return report_missing("deleted", expense_ids, deleted)
+
+
+def report_missing(action, wanted, done):
+    print(f"{len(done)} expense(s) {action} successfully!")
+    missing = sorted(set(wanted) - set(done))
+    if missing:
+        print(f"Not found: {', '.join(str(expense_id) for expense_id in missing[:20])}"
+              + (f" and {len(missing) - 20} more" if len(missing) > 20 else ""))
+        return 3
+    return 0
+
+
+def cmd_report(args):
+    if args.kind == "category":
+        rows, headers = totals_by_category(args.date_from, args.date_to), ["Category", "Expenses", "Total"]
+    elif args.kind == "month":
+        rows, headers = totals_by_month(args.date_from, args.date_to), ["Month", "Expenses", "Total"]
+    elif args.kind == "summary":
+        rows, headers = range_summary(args.date_from, args.date_to), ["Expenses", "Total", "Average", "Days"]
+    else:
+        rows, headers = top_descriptions(args.limit, args.date_from, args.date_to), ["Description", "Expenses", "Total"]
+
+    if rows is None:
+        return 1
+    print_table(headers, rows)
+    return 0
+
+
+# ------------------ PARSER ------------------
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Expense Manager command line",
+        epilog=EXAMPLES,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="add one expense, or many from a CSV/OFX file")
+    add.add_argument("--amount", type=amount_type)
+    add.add_argument("--category")
+    add.add_argument("--date", type=date_type)
+    add.add_argument("--description")
+    add.add_argument("--file", help="CSV (amount,category,date,description) or OFX file, - for stdin")
+    add.set_defaults(run=cmd_add)
+
+    show = commands.add_parser("list", help="list expenses as CSV, in id order")
+    show.add_argument("--from", dest="date_from", type=date_type)
+    show.add_argument("--to", dest="date_to", type=date_type)
+    show.add_argument("--category")
+    show.add_argument("--after-id", type=int, default=0, help="only expenses with a larger id (for paging)")
+    show.add_argument("--limit", type=int)
+    show.set_defaults(run=cmd_list)
+
+    update = commands.add_parser("update", help="change expenses by id")
+    update.add_argument("ids", nargs="*", type=int)
+    update.add_argument("--amount", type=amount_type)
+    update.add_argument("--category")
+    update.add_argument("--date", type=date_type)
+    update.add_argument("--description")
+    update.add_argument("--file", help="CSV with id and the columns to change, - for stdin")
+    update.set_defaults(run=cmd_update)
+
+    delete = commands.add_parser("delete", help="delete expenses by id")
+    delete.add_argument("ids", nargs="*", type=int)
+    delete.add_argument("--file", help="file of expense ids, - for stdin")
+    delete.set_defaults(run=cmd_delete)
+
+    report = commands.add_parser("report", help="totals by category or month, a date range summary, or top descriptions")
+    report.add_argument("kind", choices=["category", "month", "summary", "top"])
+    report.add_argument("--from", dest="date_from", type=date_type)
+    report.add_argument("--to", dest="date_to", type=date_type)
+    report.add_argument("--limit", type=int, default=10, help="descriptions to show for top")
+    report.set_defaults(run=cmd_report)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if not migrate():
+        return 1
+    warm_category_cache()
+
+    try:
+        return args.run(args)
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+import asyncio
+import os
+
+from db.settings import DB_SETTINGS
+
+# Optional: only the asyncio data layer needs it (pip install asyncpg)
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+ASYNC_POOL_MIN = int(os.environ.get("EXPENSE_DB_ASYNC_POOL_MIN", 1))
+ASYNC_POOL_MAX = int(os.environ.get("EXPENSE_DB_ASYNC_POOL_MAX", 10))
+
+_pool = None
+_pool_lock = None
+
+
+async def get_async_pool(max_size=None):
+    # One pool per process, created on first use. asyncpg pings idle
+    # connections itself and replaces the ones the server dropped.
+    global _pool, _pool_lock
+    if asyncpg is None:
+        raise RuntimeError("The async data layer needs asyncpg: pip install asyncpg")
+
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await asyncpg.create_pool(
+                min_size=ASYNC_POOL_MIN,
+                max_size=max_size or ASYNC_POOL_MAX,
+                **DB_SETTINGS,
+            )
+    return _pool
+
+
+async def close_async_pool():
+    global _pool, _pool_lock
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+    _pool_lock = None
@@ -1,14 +1,56 @@
+import os
+import threading
+import time
+
 import psycopg2
+from psycopg2 import extensions, pool
+
+from db.settings import DB_SETTINGS
+
+# Pool size, e.g. EXPENSE_DB_POOL_MAX=20 for a busy import
+POOL_MIN = int(os.environ.get("EXPENSE_DB_POOL_MIN", 1))
+POOL_MAX = int(os.environ.get("EXPENSE_DB_POOL_MAX", 5))
+# Connections idle longer than this are pinged before being handed out
+HEALTH_CHECK_AFTER = float(os.environ.get("EXPENSE_DB_HEALTH_CHECK_AFTER", 30))
+
+_pool = None
+_pool_lock = threading.Lock()
+_last_used = {}
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pool.ThreadedConnectionPool(POOL_MIN, POOL_MAX, **DB_SETTINGS)
+        return _pool
+
+
+def is_healthy(connection):
+    if connection.closed:
+        return False
+    # New and recently used connections are trusted without a round trip
+    last_used = _last_used.get(id(connection))
+    if last_used is None or time.monotonic() - last_used < HEALTH_CHECK_AFTER:
+        return True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        connection.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
 
 def connect_db():
+    # Borrows a connection from the pool; give it back with close_db()
     try:
-        connection = psycopg2.connect(
-            host="localhost",
-            database="expense_manager",
-            user="postgres",
-            password="admin",
-            port=5432
-        )
+        connections = get_pool()
+        connection = connections.getconn()
+        # Replace a connection the server dropped while it sat in the pool
+        if not is_healthy(connection):
+            connections.putconn(connection, close=True)
+            connection = connections.getconn()
         return connection
     except Exception as e:
         print(f"Error connecting to the database: {e}")
@@ -16,5 +58,28 @@ def connect_db():
 
 
 def close_db(connection):
-    if connection:
-        connection.close()
\ No newline at end of file
+    if not connection:
+        return
+
+    broken = bool(connection.closed)
+    if not broken and connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+        # Whatever the caller did not commit is not kept
+        try:
+            connection.rollback()
+        except psycopg2.Error:
+            broken = True
+
+    if broken:
+        _last_used.pop(id(connection), None)
+    else:
+        _last_used[id(connection)] = time.monotonic()
+    get_pool().putconn(connection, close=broken)
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+        _last_used.clear()
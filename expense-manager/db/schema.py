@@ -0,0 +1,263 @@
+import json
+import sys
+
+from db.connection import connect_db, close_db
+
+# Any fixed number; stops two processes from migrating at the same time
+MIGRATION_LOCK = 7316001
+
+SCHEMA_MIGRATIONS = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_on TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+"""
+
+# Rebuilds expense_daily_totals from expenses; writers wait (SHARE lock) meanwhile
+REFRESH_ROLLUPS = """
+    LOCK TABLE expenses IN SHARE MODE;
+    TRUNCATE expense_daily_totals;
+    INSERT INTO expense_daily_totals (date, category_id, count, total)
+    SELECT date, category_id, COUNT(*), SUM(amount) FROM expenses GROUP BY date, category_id;
+"""
+
+# (version, name, SQL), applied in order, each once and in its own transaction.
+# Never edit one that has shipped; add a new one instead.
+MIGRATIONS = [
+    (1, "create tables", """
+        CREATE TABLE IF NOT EXISTS categories (
+            id SERIAL PRIMARY KEY,
+            name TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS expenses (
+            id SERIAL PRIMARY KEY,
+            amount NUMERIC(12, 2) NOT NULL,
+            category_id INTEGER NOT NULL REFERENCES categories (id),
+            date DATE NOT NULL,
+            description TEXT
+        );
+    """),
+
+    # Installs that created the tables by hand: fix the column types and add
+    # the foreign key (NOT VALID: enforced for new rows, old ones unchecked)
+    (2, "column types and category foreign key", """
+        ALTER TABLE expenses
+            ALTER COLUMN amount TYPE NUMERIC(12, 2) USING amount::numeric,
+            ALTER COLUMN date TYPE DATE USING date::date;
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_constraint
+                WHERE conrelid = 'expenses'::regclass AND contype = 'f'
+            ) THEN
+                ALTER TABLE expenses ADD CONSTRAINT expenses_category_id_fkey
+                    FOREIGN KEY (category_id) REFERENCES categories (id) NOT VALID;
+            END IF;
+        END
+        $$;
+    """),
+
+    # Merge duplicate names into the lowest id first; the category upsert
+    # (ON CONFLICT (name)) needs the constraint
+    (3, "unique category names", """
+        UPDATE expenses e SET category_id = keep.id
+        FROM categories c
+        JOIN (SELECT name, MIN(id) AS id FROM categories GROUP BY name) keep ON keep.name = c.name
+        WHERE e.category_id = c.id AND c.id <> keep.id;
+
+        DELETE FROM categories c
+        USING (SELECT name, MIN(id) AS id FROM categories GROUP BY name) keep
+        WHERE keep.name = c.name AND c.id <> keep.id;
+
+        ALTER TABLE categories DROP CONSTRAINT IF EXISTS categories_name_key;
+        ALTER TABLE categories ADD CONSTRAINT categories_name_key UNIQUE (name);
+    """),
+
+    # Date-filtered reports can run as index-only scans on expenses_date
+    (4, "report indexes", """
+        CREATE INDEX IF NOT EXISTS expenses_date ON expenses (date) INCLUDE (category_id, amount);
+        CREATE INDEX IF NOT EXISTS expenses_category ON expenses (category_id, date);
+    """),
+
+    # Expense count and total per day and category. Statement-level triggers
+    # fold every insert, update and delete (COPY included) into it, so the
+    # reports read one row per day and category instead of every expense.
+    (5, "daily rollups", """
+        CREATE TABLE IF NOT EXISTS expense_daily_totals (
+            date DATE NOT NULL,
+            category_id INTEGER NOT NULL,
+            count BIGINT NOT NULL,
+            total NUMERIC NOT NULL,
+            PRIMARY KEY (date, category_id)
+        );
+
+        CREATE OR REPLACE FUNCTION expense_rollup_apply() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                INSERT INTO expense_daily_totals AS t (date, category_id, count, total)
+                SELECT date, category_id, -COUNT(*), -SUM(amount) FROM old_rows GROUP BY date, category_id
+                ON CONFLICT (date, category_id)
+                DO UPDATE SET count = t.count + EXCLUDED.count, total = t.total + EXCLUDED.total;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO expense_daily_totals AS t (date, category_id, count, total)
+                SELECT date, category_id, COUNT(*), SUM(amount) FROM new_rows GROUP BY date, category_id
+                ON CONFLICT (date, category_id)
+                DO UPDATE SET count = t.count + EXCLUDED.count, total = t.total + EXCLUDED.total;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS expenses_rollup_insert ON expenses;
+        CREATE TRIGGER expenses_rollup_insert AFTER INSERT ON expenses
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION expense_rollup_apply();
+
+        DROP TRIGGER IF EXISTS expenses_rollup_update ON expenses;
+        CREATE TRIGGER expenses_rollup_update AFTER UPDATE ON expenses
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION expense_rollup_apply();
+
+        DROP TRIGGER IF EXISTS expenses_rollup_delete ON expenses;
+        CREATE TRIGGER expenses_rollup_delete AFTER DELETE ON expenses
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION expense_rollup_apply();
+    """ + REFRESH_ROLLUPS),
+
+    # Rollup rows are upserted in key order, so two statements touching the
+    # same days and categories lock them in the same order and cannot deadlock
+    (6, "ordered rollup upserts", """
+        CREATE OR REPLACE FUNCTION expense_rollup_apply() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                INSERT INTO expense_daily_totals AS t (date, category_id, count, total)
+                SELECT date, category_id, -COUNT(*), -SUM(amount) FROM old_rows GROUP BY date, category_id
+                ORDER BY date, category_id
+                ON CONFLICT (date, category_id)
+                DO UPDATE SET count = t.count + EXCLUDED.count, total = t.total + EXCLUDED.total;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO expense_daily_totals AS t (date, category_id, count, total)
+                SELECT date, category_id, COUNT(*), SUM(amount) FROM new_rows GROUP BY date, category_id
+                ORDER BY date, category_id
+                ON CONFLICT (date, category_id)
+                DO UPDATE SET count = t.count + EXCLUDED.count, total = t.total + EXCLUDED.total;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """),
+]
+
+# (what, query, sample parameters, index its plan must use)
+PLAN_CHECKS = [
+    ("expense by id", "SELECT * FROM expenses WHERE id = %s", [1], "expenses_pkey"),
+    ("next page of expenses", "SELECT id FROM expenses WHERE id > %s ORDER BY id LIMIT 50", [0], "expenses_pkey"),
+    ("category by name", "SELECT id FROM categories WHERE name = %s", ["Food"], "categories_name_key"),
+    ("expenses in a date range",
+     "SELECT description, SUM(amount) FROM expenses WHERE date >= %s AND date <= %s GROUP BY description",
+     ["2025-01-01", "2025-01-31"], "expenses_date"),
+    ("expenses of a category",
+     "SELECT id FROM expenses WHERE category_id = %s AND date >= %s",
+     [1, "2025-01-01"], "expenses_category"),
+    ("rollups in a date range",
+     "SELECT category_id, SUM(total) FROM expense_daily_totals WHERE date >= %s AND date <= %s GROUP BY category_id",
+     ["2025-01-01", "2025-12-31"], "expense_daily_totals_pkey"),
+]
+
+
+# ------------------ MIGRATE ------------------
+def migrate():
+    connection = connect_db()
+    if not connection:
+        return False
+
+    cursor = connection.cursor()
+
+    try:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK,))
+        cursor.execute(SCHEMA_MIGRATIONS)
+        connection.commit()
+
+        cursor.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+
+        for version, name, sql in MIGRATIONS:
+            if version in applied:
+                continue
+            cursor.execute(sql)
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            connection.commit()
+            print(f"Applied migration {version}: {name}")
+
+        return True
+
+    except Exception as e:
+        connection.rollback()
+        print(f"Error: {e}")
+        return False
+
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK,))
+        connection.commit()
+        cursor.close()
+        close_db(connection)
+
+
+# ------------------ EXPLAIN CHECKS ------------------
+def plan_indexes(plan):
+    # Every index a JSON plan (or any of its child nodes) uses
+    names = set()
+    if "Index Name" in plan:
+        names.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        names |= plan_indexes(child)
+    return names
+
+
+def check_plans():
+    # Sequential scans are switched off so that small test tables still show
+    # whether the index a query path relies on exists and is usable
+    connection = connect_db()
+    if not connection:
+        return False
+
+    cursor = connection.cursor()
+    all_ok = True
+
+    try:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        for what, query, params, index in PLAN_CHECKS:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            used = plan_indexes(plan[0]["Plan"])
+            ok = index in used
+            all_ok = all_ok and ok
+            print(f"{'OK     ' if ok else 'MISSING'} {what:<28} expects {index}, uses {', '.join(sorted(used)) or 'no index'}")
+        return all_ok
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return False
+
+    finally:
+        connection.rollback()
+        cursor.close()
+        close_db(connection)
+
+
+if __name__ == "__main__":
+    # python -m db.schema migrate | check
+    command = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+    if command == "migrate":
+        ok = migrate()
+    elif command == "check":
+        ok = migrate() and check_plans()
+    else:
+        print("Usage: python -m db.schema [migrate|check]")
+        ok = False
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,8 @@
+# Shared by the psycopg2 pool (db/connection.py) and the asyncpg pool (db/async_connection.py)
+DB_SETTINGS = {
+    "host": "localhost",
+    "database": "expense_manager",
+    "user": "postgres",
+    "password": "admin",
+    "port": 5432,
+}
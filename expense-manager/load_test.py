@@ -0,0 +1,96 @@
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import date
+from decimal import Decimal
+
+from db.async_connection import get_async_pool, close_async_pool
+from modules.async_expense import add_expense, add_expenses
+
+# Inserts per second through the async data layer at several concurrency
+# levels, against the database in db/settings.py (run "python -m db.schema
+# migrate" first). Needs asyncpg. Rows are tagged and deleted afterwards.
+#
+#   python load_test.py --total 5000 --levels 1 4 16 64
+
+DEFAULT_LEVELS = [1, 4, 16, 64]
+CATEGORIES = ["Food", "Travel", "Rent", "Utilities", "Entertainment"]
+TAG = "load-test"
+
+
+def make_expense(i, run):
+    return (
+        Decimal(i % 5000 + 1) / 100,
+        CATEGORIES[i % len(CATEGORIES)],
+        date(2025, 1 + i % 12, 1 + i % 28),
+        f"{TAG} {run} #{i}",
+    )
+
+
+async def run_level(concurrency, total, run):
+    # `concurrency` feeds share one counter and insert one expense at a time
+    latencies = []
+    next_index = 0
+
+    async def feed():
+        nonlocal next_index
+        while next_index < total:
+            i = next_index
+            next_index += 1
+            start = time.perf_counter()
+            await add_expense(*make_expense(i, run))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(feed() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    return total / elapsed, statistics.median(latencies) if latencies else 0, p95
+
+
+async def cleanup(run):
+    pool = await get_async_pool()
+    async with pool.acquire() as connection:
+        await connection.execute("DELETE FROM expenses WHERE description LIKE $1", f"{TAG} {run} #%")
+
+
+async def main(total, levels, keep):
+    run = time.strftime("%Y%m%d%H%M%S")
+    await get_async_pool(max_size=max(levels))
+
+    print(f"{'Feeds':>6} {'Inserts/s':>10} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    try:
+        for level in levels:
+            rate, p50, p95 = await run_level(level, total, f"{run}-{level}")
+            print(f"{level:>6} {rate:>10.0f} {p50 * 1e3:>9.2f} {p95 * 1e3:>9.2f}")
+            if not keep:
+                await cleanup(f"{run}-{level}")
+
+        # For comparison: the same rows in one COPY
+        start = time.perf_counter()
+        await add_expenses([make_expense(i, f"{run}-copy") for i in range(total)])
+        rate = total / (time.perf_counter() - start)
+        print(f"{'COPY':>6} {rate:>10.0f}")
+        if not keep:
+            await cleanup(f"{run}-copy")
+
+    finally:
+        await close_async_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test for the async expense data layer")
+    parser.add_argument("--total", type=int, default=5000, help="expenses inserted per concurrency level")
+    parser.add_argument("--levels", type=int, nargs="+", default=DEFAULT_LEVELS, help="numbers of concurrent feeds")
+    parser.add_argument("--keep", action="store_true", help="leave the inserted rows in the database")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args.total, args.levels, args.keep))
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
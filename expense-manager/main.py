@@ -1,9 +1,18 @@
 from modules.expense import add_expense, view_expenses, update_expense, delete_expense
+from modules.category import warm_category_cache
+from modules.importer import import_file
+from modules.report import reports_menu
 from utils.menu import show_menu
-from db.connection import connect_db, close_db
+from db.connection import close_pool
+from db.schema import migrate
 
 
 def main():
+    # Bring the tables and indexes up to date, then load category ids once
+    # so adding expenses skips the lookup
+    migrate()
+    warm_category_cache()
+
     while True:
         show_menu()
 
@@ -22,10 +31,15 @@ def main():
         elif choice == 4:
             delete_expense()
         elif choice == 5:
+            import_file()
+        elif choice == 6:
+            reports_menu()
+        elif choice == 7:
+            close_pool()
             print("Thank you !!!")
             break
         else:
-            print("Wrong input! Please choose between 1-5.")
+            print("Wrong input! Please choose between 1-7.")
 
 
 if __name__ == "__main__":
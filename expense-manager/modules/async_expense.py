@@ -0,0 +1,119 @@
+from db.async_connection import get_async_pool
+
+# asyncio versions of the operations in modules/expense.py, for feeds that
+# ingest expenses concurrently. Dates are datetime.date objects and
+# amounts Decimal (or int); asyncpg does not convert strings.
+
+FETCH_SIZE = 2000
+
+# Category name -> id; the upsert commits on its own, so a cached id always exists
+category_ids = {}
+
+UPSERT_CATEGORY = """
+    INSERT INTO categories (name) VALUES ($1)
+    ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+    RETURNING id
+"""
+
+INSERT_EXPENSE = """
+    INSERT INTO expenses (amount, category_id, date, description)
+    VALUES ($1, $2, $3, $4)
+    RETURNING id
+"""
+
+UPDATE_EXPENSE = """
+    UPDATE expenses SET
+        amount = COALESCE($2, amount),
+        category_id = COALESCE($3, category_id),
+        date = COALESCE($4, date),
+        description = COALESCE($5, description)
+    WHERE id = $1
+"""
+
+DELETE_EXPENSES = "DELETE FROM expenses WHERE id = ANY($1::integer[]) RETURNING id"
+
+EXPENSE_QUERY = """
+    SELECT e.id, e.amount, c.name, e.date, e.description
+    FROM expenses e
+    JOIN categories c ON e.category_id = c.id
+    WHERE e.id > $1 {filters}
+    ORDER BY e.id
+    LIMIT $2
+"""
+
+
+# ------------------ CATEGORIES ------------------
+async def get_category_id(connection, name):
+    category_id = category_ids.get(name)
+    if category_id is None:
+        category_id = category_ids[name] = await connection.fetchval(UPSERT_CATEGORY, name)
+    return category_id
+
+
+# ------------------ ADD EXPENSES ------------------
+async def add_expense(amount, category, date, description=""):
+    pool = await get_async_pool()
+    async with pool.acquire() as connection:
+        category_id = await get_category_id(connection, category)
+        return await connection.fetchval(INSERT_EXPENSE, amount, category_id, date, description)
+
+
+async def add_expenses(expenses):
+    # [(amount, category, date, description), ...] in one transaction via COPY
+    pool = await get_async_pool()
+    async with pool.acquire() as connection:
+        records = []
+        for amount, category, date, description in expenses:
+            records.append((amount, await get_category_id(connection, category), date, description))
+        async with connection.transaction():
+            await connection.copy_records_to_table(
+                "expenses", records=records, columns=["amount", "category_id", "date", "description"]
+            )
+    return len(records)
+
+
+# ------------------ LIST EXPENSES ------------------
+async def iter_expenses(after_id=0, limit=None, start_date=None, end_date=None, category=None):
+    # Async generator over matching expenses in id order, FETCH_SIZE rows at a time
+    filters = []
+    params = [after_id, limit]
+    if start_date:
+        params.append(start_date)
+        filters.append(f"AND e.date >= ${len(params)}")
+    if end_date:
+        params.append(end_date)
+        filters.append(f"AND e.date <= ${len(params)}")
+    if category:
+        params.append(category)
+        filters.append(f"AND c.name = ${len(params)}")
+
+    pool = await get_async_pool()
+    async with pool.acquire() as connection:
+        # asyncpg cursors only live inside a transaction
+        async with connection.transaction():
+            query = EXPENSE_QUERY.format(filters=" ".join(filters))
+            async for row in connection.cursor(query, *params, prefetch=FETCH_SIZE):
+                yield tuple(row)
+
+
+# ------------------ UPDATE EXPENSE ------------------
+async def update_expense(expense_id, amount=None, category=None, date=None, description=None):
+    # None keeps the current value; returns False if there is no such expense
+    pool = await get_async_pool()
+    async with pool.acquire() as connection:
+        category_id = await get_category_id(connection, category) if category is not None else None
+        status = await connection.execute(UPDATE_EXPENSE, expense_id, amount, category_id, date, description)
+    return status != "UPDATE 0"
+
+
+# ------------------ DELETE EXPENSES ------------------
+async def delete_expenses(expense_ids):
+    # Returns the ids that existed and were deleted
+    pool = await get_async_pool()
+    async with pool.acquire() as connection:
+        rows = await connection.fetch(DELETE_EXPENSES, list(expense_ids))
+    return [row["id"] for row in rows]
+
+
+async def delete_expense(expense_id):
+    return bool(await delete_expenses([expense_id]))
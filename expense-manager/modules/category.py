@@ -0,0 +1,66 @@
+from db.connection import connect_db, close_db
+
+# Category name -> id for this process, so most writes skip the lookup
+category_ids = {}
+
+# One round trip whether or not the category exists yet; the unique
+# constraint on name (db/schema.py) stops two writers from creating it twice
+UPSERT_CATEGORY = """
+    INSERT INTO categories (name) VALUES (%s)
+    ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+    RETURNING id
+"""
+
+# The same for many names at once
+UPSERT_CATEGORIES = """
+    INSERT INTO categories (name) SELECT unnest(%s::text[])
+    ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+    RETURNING id, name
+"""
+
+
+# ------------------ CATEGORY CACHE ------------------
+def warm_category_cache():
+    connection = connect_db()
+    if not connection:
+        return
+
+    cursor = connection.cursor()
+
+    try:
+        cursor.execute("SELECT id, name FROM categories")
+        category_ids.clear()
+        for category_id, name in cursor:
+            category_ids[name] = category_id
+        connection.commit()
+
+    except Exception as e:
+        print(f"Error: {e}")
+
+    finally:
+        cursor.close()
+        close_db(connection)
+
+
+def get_category_id(cursor, name):
+    category_id = category_ids.get(name)
+    if category_id is None:
+        cursor.execute(UPSERT_CATEGORY, (name,))
+        category_id = category_ids[name] = cursor.fetchone()[0]
+    return category_id
+
+
+def get_category_ids(cursor, names):
+    # Every name the cache doesn't know yet, created/looked up in one statement
+    missing = sorted(set(names) - category_ids.keys())
+    if missing:
+        cursor.execute(UPSERT_CATEGORIES, (missing,))
+        for category_id, name in cursor.fetchall():
+            category_ids[name] = category_id
+    return [category_ids[name] for name in names]
+
+
+def forget_category(name):
+    # Call when a write fails: a category created in a rolled back
+    # transaction does not exist, and a cached id may have gone stale
+    category_ids.pop(name, None)
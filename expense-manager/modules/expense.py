@@ -92,7 +92,41 @@
 #         print("Expense deleted successfully")
 
 
+from psycopg2.extras import execute_values
+
 from db.connection import connect_db, close_db
+from modules.category import get_category_id, get_category_ids, forget_category
+
+PAGE_SIZE = 50      # expenses shown before asking to continue
+FETCH_SIZE = 2000   # rows the server-side cursor sends per round trip
+
+BATCH_SIZE = 1000   # rows per statement for batch add/update/delete
+
+EXPENSE_QUERY = """
+    SELECT e.id, e.amount, c.name, e.date, e.description
+    FROM expenses e
+    JOIN categories c ON e.category_id = c.id
+    WHERE e.id > %s {filters}
+    ORDER BY e.id
+    LIMIT %s
+"""
+
+INSERT_EXPENSES = "INSERT INTO expenses (amount, category_id, date, description) VALUES %s RETURNING id"
+
+# Fields left as NULL keep their current value
+UPDATE_EXPENSES = """
+    UPDATE expenses e SET
+        amount = COALESCE(v.amount, e.amount),
+        category_id = COALESCE(v.category_id, e.category_id),
+        date = COALESCE(v.date, e.date),
+        description = COALESCE(v.description, e.description)
+    FROM (VALUES %s) AS v (id, amount, category_id, date, description)
+    WHERE e.id = v.id
+    RETURNING e.id
+"""
+UPDATE_TEMPLATE = "(%s::integer, %s::numeric, %s::integer, %s::date, %s::text)"
+
+DELETE_EXPENSES = "DELETE FROM expenses WHERE id = ANY(%s) RETURNING id"
 
 # ------------------ ADD EXPENSE ------------------
 def add_expense():
@@ -113,21 +147,10 @@ def add_expense():
     cursor = connection.cursor()
 
     try:
-        # Step 1: Check if category exists
-        cursor.execute("SELECT id FROM categories WHERE name = %s", (category_name,))
-        result = cursor.fetchone()
-
-        if result:
-            category_id = result[0]
-        else:
-            # Step 2: Insert new category
-            cursor.execute(
-                "INSERT INTO categories (name) VALUES (%s) RETURNING id",
-                (category_name,)
-            )
-            category_id = cursor.fetchone()[0]
-
-        # Step 3: Insert expense
+        # Step 1: Category id from the cache, created on first use
+        category_id = get_category_id(cursor, category_name)
+
+        # Step 2: Insert expense
         cursor.execute(
             """
             INSERT INTO expenses (amount, category_id, date, description)
@@ -140,6 +163,7 @@ def add_expense():
         print("Expense added successfully!")
 
     except Exception as e:
+        forget_category(category_name)
         print(f"Error: {e}")
 
     finally:
@@ -147,50 +171,94 @@ def add_expense():
         close_db(connection)
 
 
+# ------------------ STREAM EXPENSES ------------------
+def expense_filters(start_date=None, end_date=None, category=None):
+    filters = []
+    params = []
+
+    if start_date:
+        filters.append("AND e.date >= %s")
+        params.append(start_date)
+    if end_date:
+        filters.append("AND e.date <= %s")
+        params.append(end_date)
+    if category:
+        filters.append("AND c.name = %s")
+        params.append(category)
+
+    return " ".join(filters), params
+
+
+def iter_expenses(connection, after_id=0, limit=None, start_date=None, end_date=None, category=None):
+    # Expenses with id > after_id in id order. A named (server-side) cursor
+    # sends FETCH_SIZE rows at a time, so memory stays flat however many match.
+    filters, params = expense_filters(start_date, end_date, category)
+
+    cursor = connection.cursor(name="stream_expenses")
+    cursor.itersize = FETCH_SIZE
+
+    try:
+        cursor.execute(EXPENSE_QUERY.format(filters=filters), [after_id] + params + [limit])
+        for row in cursor:
+            yield row
+    finally:
+        cursor.close()
+
+
 # ------------------ VIEW EXPENSES ------------------
 def view_expenses():
+    start_date = input("From date (YYYY-MM-DD, blank for any): ").strip() or None
+    end_date = input("To date (YYYY-MM-DD, blank for any): ").strip() or None
+    category = input("Category (blank for all): ").strip() or None
+
     connection = connect_db()
     if not connection:
         return
 
-    cursor = connection.cursor()
+    expense_ids = []   # ids of the expenses shown, by number, for update/delete
+    last_id = 0
 
     try:
-        cursor.execute("""
-            SELECT e.id, e.amount, c.name, e.date, e.description
-            FROM expenses e
-            JOIN categories c ON e.category_id = c.id
-            ORDER BY e.id
-        """)
-
-        rows = cursor.fetchall()
-
-        if not rows:
+        while True:
+            # Each page starts after the last id shown (keyset pagination)
+            shown = 0
+            for row in iter_expenses(connection, last_id, PAGE_SIZE, start_date, end_date, category):
+                expense_ids.append(row[0])
+                last_id = row[0]
+                shown += 1
+
+                print(f"\nExpense {len(expense_ids)}:")
+                print(f"ID: {row[0]}")
+                print(f"Amount: {row[1]}")
+                print(f"Category: {row[2]}")
+                print(f"Date: {row[3]}")
+                print(f"Description: {row[4]}")
+
+            # Don't keep a transaction open while waiting for the user
+            connection.commit()
+
+            if shown < PAGE_SIZE:
+                break
+            if input("\nPress Enter for more, or q to stop: ").strip().lower() == "q":
+                break
+
+        if not expense_ids:
             print("No expenses found")
             return
 
-        for index, row in enumerate(rows, start=1):
-            print(f"\nExpense {index}:")
-            print(f"ID: {row[0]}")
-            print(f"Amount: {row[1]}")
-            print(f"Category: {row[2]}")
-            print(f"Date: {row[3]}")
-            print(f"Description: {row[4]}")
-
-        return rows  # VERY IMPORTANT for update/delete
+        return expense_ids  # VERY IMPORTANT for update/delete
 
     except Exception as e:
         print(f"Error: {e}")
 
     finally:
-        cursor.close()
         close_db(connection)
 
 
 # ------------------ UPDATE EXPENSE ------------------
 def update_expense():
-    rows = view_expenses()
-    if not rows:
+    expense_ids = view_expenses()
+    if not expense_ids:
         return
 
     try:
@@ -199,11 +267,11 @@ def update_expense():
         print("Invalid input!")
         return
 
-    if choice < 1 or choice > len(rows):
+    if choice < 1 or choice > len(expense_ids):
         print("Invalid choice")
         return
 
-    expense_id = rows[choice - 1][0]
+    expense_id = expense_ids[choice - 1]
 
     try:
         new_amount = float(input("Enter new amount: "))
@@ -223,17 +291,7 @@ def update_expense():
 
     try:
         # Handle category
-        cursor.execute("SELECT id FROM categories WHERE name = %s", (new_category,))
-        result = cursor.fetchone()
-
-        if result:
-            category_id = result[0]
-        else:
-            cursor.execute(
-                "INSERT INTO categories (name) VALUES (%s) RETURNING id",
-                (new_category,)
-            )
-            category_id = cursor.fetchone()[0]
+        category_id = get_category_id(cursor, new_category)
 
         # Update expense
         cursor.execute("""
@@ -246,6 +304,7 @@ def update_expense():
         print("Expense updated successfully!")
 
     except Exception as e:
+        forget_category(new_category)
         print(f"Error: {e}")
 
     finally:
@@ -255,8 +314,8 @@ def update_expense():
 
 # ------------------ DELETE EXPENSE ------------------
 def delete_expense():
-    rows = view_expenses()
-    if not rows:
+    expense_ids = view_expenses()
+    if not expense_ids:
         return
 
     try:
@@ -265,11 +324,11 @@ def delete_expense():
         print("Invalid input!")
         return
 
-    if choice < 1 or choice > len(rows):
+    if choice < 1 or choice > len(expense_ids):
         print("Invalid choice")
         return
 
-    expense_id = rows[choice - 1][0]
+    expense_id = expense_ids[choice - 1]
 
     connection = connect_db()
     if not connection:
@@ -287,4 +346,97 @@ def delete_expense():
 
     finally:
         cursor.close()
-        close_db(connection)
\ No newline at end of file
+        close_db(connection)
+
+
+# ------------------ BATCH OPERATIONS ------------------
+# Non-interactive versions for scripts (see cli.py). Each call is one
+# transaction: everything is applied or, on error, nothing.
+
+def add_expenses(expenses):
+    # [(amount, category, date, description), ...] -> new ids, or None on error
+    connection = connect_db()
+    if not connection:
+        return None
+
+    cursor = connection.cursor()
+
+    try:
+        ids = get_category_ids(cursor, [expense[1] for expense in expenses])
+        rows = [
+            (amount, category_id, date, description)
+            for (amount, _, date, description), category_id in zip(expenses, ids)
+        ]
+        new_ids = execute_values(cursor, INSERT_EXPENSES, rows, page_size=BATCH_SIZE, fetch=True)
+        connection.commit()
+        return [row[0] for row in new_ids]
+
+    except Exception as e:
+        connection.rollback()
+        for expense in expenses:
+            forget_category(expense[1])
+        print(f"Error: {e}")
+        return None
+
+    finally:
+        cursor.close()
+        close_db(connection)
+
+
+def update_expenses(updates):
+    # [(id, amount, category, date, description), ...] with None for "keep";
+    # returns the ids that exist and were updated, or None on error
+    connection = connect_db()
+    if not connection:
+        return None
+
+    cursor = connection.cursor()
+
+    try:
+        names = [update[2] for update in updates if update[2] is not None]
+        get_category_ids(cursor, names)
+        rows = [
+            (expense_id, amount, get_category_id(cursor, category) if category is not None else None, date, description)
+            for expense_id, amount, category, date, description in updates
+        ]
+        updated = execute_values(cursor, UPDATE_EXPENSES, rows, template=UPDATE_TEMPLATE, page_size=BATCH_SIZE, fetch=True)
+        connection.commit()
+        return [row[0] for row in updated]
+
+    except Exception as e:
+        connection.rollback()
+        for update in updates:
+            if update[2] is not None:
+                forget_category(update[2])
+        print(f"Error: {e}")
+        return None
+
+    finally:
+        cursor.close()
+        close_db(connection)
+
+
+def delete_expenses(expense_ids):
+    # Returns the ids that existed and were deleted, or None on error
+    connection = connect_db()
+    if not connection:
+        return None
+
+    cursor = connection.cursor()
+
+    try:
+        deleted = []
+        for start in range(0, len(expense_ids), BATCH_SIZE * 10):
+            cursor.execute(DELETE_EXPENSES, (list(expense_ids[start:start + BATCH_SIZE * 10]),))
+            deleted.extend(row[0] for row in cursor.fetchall())
+        connection.commit()
+        return deleted
+
+    except Exception as e:
+        connection.rollback()
+        print(f"Error: {e}")
+        return None
+
+    finally:
+        cursor.close()
+        close_db(connection)
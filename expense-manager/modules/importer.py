@@ -0,0 +1,206 @@
+import csv
+import html
+import io
+import re
+import sys
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from pathlib import Path
+
+from db.connection import connect_db, close_db
+from modules.category import category_ids, get_category_ids
+
+BATCH_SIZE = 10000
+DEFAULT_CATEGORY = "Imported"   # bank statements carry no category
+
+# expenses.amount is NUMERIC(12, 2) (db/schema.py): cents, under 10^10.
+# A value COPY cannot store would fail the whole file, so it is rejected here.
+CENT = Decimal("0.01")
+AMOUNT_LIMIT = Decimal(10) ** 10
+
+# csv.writer leaves an empty description unquoted, which COPY would read as NULL
+COPY_EXPENSES = (
+    "COPY expenses (amount, category_id, date, description) FROM STDIN "
+    "WITH (FORMAT csv, FORCE_NOT_NULL (description))"
+)
+
+OFX_TAG = re.compile(r"<(\w+)>([^<\r\n]*)")
+
+
+# ------------------ READ FILES ------------------
+def read_csv(path):
+    # (line number, fields) for a CSV with amount, category, date and description columns;
+    # "-" reads standard input
+    f = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8-sig")
+    try:
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def read_ofx(path):
+    # (line number, fields) for each <STMTTRN> in an OFX/QFX bank statement.
+    # Works for the SGML (one tag per line) and XML flavours.
+    transaction = None
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line_num, line in enumerate(f, start=1):
+            for tag, value in OFX_TAG.findall(line):
+                tag = tag.upper()
+                if tag == "STMTTRN":
+                    transaction = {"line": line_num}
+                elif transaction is not None and value.strip():
+                    # Values are escaped like HTML, e.g. "Bus &amp; Rail"
+                    transaction[tag] = html.unescape(value.strip())
+            if transaction is not None and "</STMTTRN>" in line.upper():
+                yield transaction.pop("line"), ofx_fields(transaction)
+                transaction = None
+
+
+def ofx_fields(transaction):
+    amount = transaction.get("TRNAMT", "")
+    # Money going out is negative on a statement; anything else is not an expense
+    if amount.startswith("-"):
+        amount = amount[1:]
+    elif amount:
+        amount = "credit:" + amount
+    posted = transaction.get("DTPOSTED", "")[:8]
+    return {
+        "amount": amount,
+        "category": DEFAULT_CATEGORY,
+        "date": f"{posted[:4]}-{posted[4:6]}-{posted[6:8]}" if len(posted) == 8 else posted,
+        "description": transaction.get("NAME") or transaction.get("MEMO") or "",
+    }
+
+
+def read_rows(path):
+    if Path(path).suffix.lower() in (".ofx", ".qfx"):
+        return read_ofx(path)
+    return read_csv(path)
+
+
+# ------------------ VALIDATE ------------------
+def parse_amount(raw_amount):
+    # Rounded to cents the way Postgres rounds; raises ValueError if it cannot be stored
+    try:
+        amount = Decimal(raw_amount)
+    except InvalidOperation:
+        raise ValueError(f"invalid amount {raw_amount!r}")
+    if not amount.is_finite() or amount <= 0:
+        raise ValueError(f"invalid amount {raw_amount!r}")
+
+    # Checked before and after rounding: 9999999999.995 only overflows once rounded
+    if amount < AMOUNT_LIMIT:
+        amount = amount.quantize(CENT, rounding=ROUND_HALF_UP)
+    if amount >= AMOUNT_LIMIT:
+        raise ValueError(f"amount {raw_amount!r} too large")
+    if amount == 0:
+        raise ValueError(f"amount {raw_amount!r} rounds to zero")
+    return amount
+
+
+def parse_row(fields):
+    # (amount, category, date, description), or raises ValueError with the reason
+    raw_amount = (fields.get("amount") or "").strip()
+    if raw_amount.startswith("credit:"):
+        raise ValueError("credit, not an expense")
+    amount = parse_amount(raw_amount)
+
+    category = (fields.get("category") or "").strip()
+    if not category:
+        raise ValueError("missing category")
+
+    raw_date = (fields.get("date") or "").strip()
+    try:
+        expense_date = date.fromisoformat(raw_date)
+    except ValueError:
+        raise ValueError(f"invalid date {raw_date!r}, expected YYYY-MM-DD")
+
+    description = (fields.get("description") or "").strip()
+    # Postgres text cannot hold NUL
+    if "\0" in category or "\0" in description:
+        raise ValueError("NUL character in category or description")
+    return amount, category, expense_date, description
+
+
+# ------------------ LOAD ------------------
+def copy_batch(cursor, batch):
+    get_category_ids(cursor, [row[1] for row in batch])
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for amount, category, expense_date, description in batch:
+        writer.writerow([amount, category_ids[category], expense_date.isoformat(), description])
+    buffer.seek(0)
+    cursor.copy_expert(COPY_EXPENSES, buffer)
+
+
+def import_expenses(path, batch_size=BATCH_SIZE):
+    # Streams the file into the expenses table in batches, all in one
+    # transaction. Rows that fail validation go to <file>.rejects.csv.
+    reject_path = Path("stdin.rejects.csv" if path == "-" else str(path) + ".rejects.csv")
+
+    connection = connect_db()
+    if not connection:
+        return False
+
+    cursor = connection.cursor()
+    imported = 0
+    rejected = 0
+    batch = []
+    start = time.perf_counter()
+
+    try:
+        with open(reject_path, "w", newline="", encoding="utf-8") as reject_file:
+            rejects = csv.writer(reject_file)
+            rejects.writerow(["line", "reason", "amount", "category", "date", "description"])
+
+            for line_num, fields in read_rows(path):
+                try:
+                    batch.append(parse_row(fields))
+                except ValueError as e:
+                    rejected += 1
+                    rejects.writerow([line_num, str(e)] + [fields.get(key, "") for key in ("amount", "category", "date", "description")])
+                    continue
+
+                if len(batch) >= batch_size:
+                    copy_batch(cursor, batch)
+                    imported += len(batch)
+                    batch = []
+                    print(f"  {imported} rows loaded...")
+
+            if batch:
+                copy_batch(cursor, batch)
+                imported += len(batch)
+
+        connection.commit()
+        elapsed = time.perf_counter() - start
+        print(f"Imported {imported} expenses in {elapsed:.1f}s ({imported / max(elapsed, 1e-9):.0f} rows/sec)")
+        if rejected:
+            print(f"{rejected} rows rejected, see {reject_path}")
+        return True
+
+    except Exception as e:
+        connection.rollback()
+        # Categories created in this transaction are gone again
+        category_ids.clear()
+        print(f"Error: {e}")
+        print("Nothing was imported.")
+        return False
+
+    finally:
+        cursor.close()
+        close_db(connection)
+
+
+# ------------------ IMPORT EXPENSES ------------------
+def import_file():
+    path = input("Enter path to a CSV or OFX file: ").strip()
+    if not Path(path).is_file():
+        print("File not found!")
+        return
+
+    import_expenses(path)
@@ -0,0 +1,198 @@
+from datetime import date
+
+from db.connection import connect_db, close_db
+from db.schema import REFRESH_ROLLUPS
+from utils.menu import show_reports_menu
+
+# The rollup table (expense_daily_totals, see db/schema.py) has one row per
+# day and category, so these read far fewer rows than there are expenses
+CATEGORY_TOTALS = """
+    SELECT c.name, t.count, t.total
+    FROM (
+        SELECT category_id, SUM(count) AS count, SUM(total) AS total
+        FROM expense_daily_totals
+        WHERE {where}
+        GROUP BY category_id
+        HAVING SUM(count) > 0
+    ) t
+    JOIN categories c ON c.id = t.category_id
+    ORDER BY t.total DESC
+"""
+
+MONTHLY_TOTALS = """
+    SELECT to_char(date_trunc('month', date), 'YYYY-MM') AS month, SUM(count), SUM(total)
+    FROM expense_daily_totals
+    WHERE {where}
+    GROUP BY date_trunc('month', date)
+    HAVING SUM(count) > 0
+    ORDER BY date_trunc('month', date)
+"""
+
+RANGE_SUMMARY = """
+    SELECT COALESCE(SUM(count), 0), SUM(total), SUM(total) / NULLIF(SUM(count), 0),
+           COUNT(DISTINCT date) FILTER (WHERE count > 0)
+    FROM expense_daily_totals
+    WHERE {where}
+"""
+
+# Descriptions are not rolled up, this one still reads expenses
+TOP_DESCRIPTIONS = """
+    SELECT description, COUNT(*), SUM(amount)
+    FROM expenses
+    WHERE {where}
+    GROUP BY description
+    ORDER BY SUM(amount) DESC
+    LIMIT %s
+"""
+
+
+# ------------------ ROLLUPS ------------------
+def refresh_rollups():
+    connection = connect_db()
+    if not connection:
+        return
+
+    cursor = connection.cursor()
+
+    try:
+        cursor.execute(REFRESH_ROLLUPS)
+        connection.commit()
+        print("Rollups rebuilt successfully!")
+
+    except Exception as e:
+        print(f"Error: {e}")
+
+    finally:
+        cursor.close()
+        close_db(connection)
+
+
+# ------------------ HELPERS ------------------
+def ask_date(prompt):
+    text = input(prompt).strip()
+    if not text:
+        return None
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        print("Invalid date! Using no limit.")
+        return None
+
+
+def ask_date_range():
+    start_date = ask_date("From date (YYYY-MM-DD, blank for any): ")
+    end_date = ask_date("To date (YYYY-MM-DD, blank for any): ")
+    return start_date, end_date
+
+
+def date_filter(start_date=None, end_date=None):
+    conditions = ["TRUE"]
+    params = []
+
+    if start_date:
+        conditions.append("date >= %s")
+        params.append(start_date)
+    if end_date:
+        conditions.append("date <= %s")
+        params.append(end_date)
+
+    return " AND ".join(conditions), params
+
+
+def run_report(query, params):
+    # Reports return one row per group, so fetching them all is fine
+    connection = connect_db()
+    if not connection:
+        return None
+
+    cursor = connection.cursor()
+
+    try:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return None
+
+    finally:
+        cursor.close()
+        close_db(connection)
+
+
+def print_table(headers, rows):
+    if not rows:
+        print("No expenses found")
+        return
+
+    print()
+    print(" | ".join(f"{header:<20}" for header in headers))
+    print("-" * 23 * len(headers))
+    for row in rows:
+        print(" | ".join(f"{str(value if value is not None else '-'):<20}" for value in row))
+
+
+# ------------------ REPORTS ------------------
+def totals_by_category(start_date=None, end_date=None):
+    where, params = date_filter(start_date, end_date)
+    return run_report(CATEGORY_TOTALS.format(where=where), params)
+
+
+def totals_by_month(start_date=None, end_date=None):
+    where, params = date_filter(start_date, end_date)
+    return run_report(MONTHLY_TOTALS.format(where=where), params)
+
+
+def range_summary(start_date=None, end_date=None):
+    where, params = date_filter(start_date, end_date)
+    return run_report(RANGE_SUMMARY.format(where=where), params)
+
+
+def top_descriptions(limit=10, start_date=None, end_date=None):
+    where, params = date_filter(start_date, end_date)
+    return run_report(TOP_DESCRIPTIONS.format(where=where), params + [limit])
+
+
+# ------------------ REPORTS MENU ------------------
+def reports_menu():
+    while True:
+        show_reports_menu()
+
+        try:
+            choice = int(input("Enter your choice: "))
+        except ValueError:
+            print("Invalid input! Please enter a number.")
+            continue
+
+        if choice == 6:
+            return
+        if choice == 5:
+            refresh_rollups()
+            continue
+        if choice not in (1, 2, 3, 4):
+            print("Wrong input! Please choose between 1-6.")
+            continue
+
+        start_date, end_date = ask_date_range()
+
+        if choice == 1:
+            rows = totals_by_category(start_date, end_date)
+            if rows is not None:
+                print_table(["Category", "Expenses", "Total"], rows)
+        elif choice == 2:
+            rows = totals_by_month(start_date, end_date)
+            if rows is not None:
+                print_table(["Month", "Expenses", "Total"], rows)
+        elif choice == 3:
+            rows = range_summary(start_date, end_date)
+            if rows is not None:
+                print_table(["Expenses", "Total", "Average", "Days"], rows)
+        elif choice == 4:
+            try:
+                limit = int(input("How many descriptions (default 10): ") or 10)
+            except ValueError:
+                print("Invalid number! Showing 10.")
+                limit = 10
+            rows = top_descriptions(limit, start_date, end_date)
+            if rows is not None:
+                print_table(["Description", "Expenses", "Total"], rows)
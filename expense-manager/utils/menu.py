@@ -4,5 +4,16 @@ def show_menu():
     print("2. View Expenses")
     print("3. Update Expense")
     print("4. Delete Expense")
-    print("5. Exit")
+    print("5. Import Expenses (CSV/OFX)")
+    print("6. Reports")
+    print("7. Exit")
 
+
+def show_reports_menu():
+    print("\n===== Reports =====")
+    print("1. Totals by Category")
+    print("2. Totals by Month")
+    print("3. Date Range Summary")
+    print("4. Top Descriptions")
+    print("5. Rebuild Rollups")
+    print("6. Back")
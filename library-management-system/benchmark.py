@@ -0,0 +1,249 @@
+import atexit
+import gc
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from library_core import Book, Library, Loan, Member, now, open_storage
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+BACKENDS = [".json", ".db"]
+OPERATIONS_TIMED = 2_000
+SEARCHES = 200
+CART = 50
+# Stress run: processes x threads x operations, over a few books with few copies
+PROCESSES = 4
+THREADS = 4
+OPERATIONS = 250
+
+# A few thousand made-up words, so titles share vocabulary like real ones do
+SYLLABLES = ["ka", "lo", "mi", "ter", "an", "vel", "dor", "si", "que", "ra", "bel", "nox", "ul", "fen", "tir"]
+WORDS = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+
+
+def make_title(i):
+    return " ".join(WORDS[(i * k * 2654435761) % len(WORDS)] for k in (1, 2, 3)).title()
+
+
+# Every benchmark writes its databases to a scratch directory, made when
+# run as a script; tests import the helpers below and pass their own paths
+workdir = None
+
+
+def seed(database, n_books, n_members=1_000, copies=3):
+    # Books B-0000000... and members M-0000000..., shared with the tests
+    added_on = now()
+    books = [Book(f"B-{i:07d}", make_title(i), make_title(i % 5000 + 7), copies, copies, added_on) for i in range(n_books)]
+    members = [Member(f"M-{i:07d}", f"Member {i}", f"m{i}@example.com") for i in range(n_members)]
+
+    storage = open_storage(database)
+    storage.replace_records(books, members)
+    return storage
+
+
+def drifted_books(storage):
+    # Ids of books whose copies are not all either on the shelf or on exactly one loan
+    on_loan = {}
+    for member in storage.iter_members():
+        for loan in member.borrowed:
+            on_loan[loan.book_id] = on_loan.get(loan.book_id, 0) + 1
+    return [
+        book.id
+        for book in storage.iter_books()
+        if book.available_copies < 0 or book.available_copies + on_loan.get(book.id, 0) != book.total_copies
+    ]
+
+
+def bench_circulation():
+    # Per-call cost of the Library operations the front ends use
+    print(f"{'Backend':>8} {'Books':>10} {'Add (us)':>9} {'Lookup (us)':>12} {'Borrow (us)':>12} {'Return (us)':>12}")
+    for backend in BACKENDS:
+        for size in SIZES:
+            library = Library(os.path.join(workdir, f"circulation-{size}{backend}"), lambda database: seed(database, size))
+            # The storage opens (and here, seeds itself) on first use, keep that out of the timings
+            library.count_books()
+            # Spread lookups over the whole catalogue
+            pairs = [(f"M-{i % 1000:07d}", f"B-{(i * 7919) % size:07d}") for i in range(OPERATIONS_TIMED)]
+
+            start = time.perf_counter()
+            for i in range(OPERATIONS_TIMED):
+                library.add_book(make_title(i), make_title(i + 1), 2)
+            add = (time.perf_counter() - start) / OPERATIONS_TIMED
+
+            start = time.perf_counter()
+            for member_id, book_id in pairs:
+                library.get_member(member_id)
+                library.get_book(book_id)
+            lookup = (time.perf_counter() - start) / OPERATIONS_TIMED
+
+            start = time.perf_counter()
+            for member_id, book_id in pairs:
+                library.borrow_book(member_id, book_id)
+            borrow = (time.perf_counter() - start) / OPERATIONS_TIMED
+
+            start = time.perf_counter()
+            for member_id, book_id in pairs:
+                # Oldest loan first, so every call finds one to return
+                library.return_book(member_id, library.get_member(member_id).borrowed[0])
+            returned = (time.perf_counter() - start) / OPERATIONS_TIMED
+
+            print(
+                f"{backend:>8} {size:>10} {add * 1e6:>9.1f} {lookup * 1e6:>12.2f} "
+                f"{borrow * 1e6:>12.1f} {returned * 1e6:>12.1f}"
+            )
+
+
+def bench_search():
+    print(f"{'Backend':>8} {'Books':>10} {'Scan (ms)':>10} {'Index (ms)':>11}")
+    for backend in BACKENDS:
+        for size in [10_000, 100_000, 500_000]:
+            storage = seed(os.path.join(workdir, f"search-{size}{backend}"), size)
+            # Whole words, prefixes and two-word queries picked from real titles
+            queries = []
+            for i in range(SEARCHES):
+                words = make_title(i * 31).lower().split()
+                queries.append([words[0], words[1][:3], words[0] + " " + words[2][:4]][i % 3])
+
+            # The old substring scan is slow enough that a sample will do
+            start = time.perf_counter()
+            for query in queries[:20]:
+                [b for b in storage.iter_books() if query in b.title.lower() or query in b.author.lower()]
+            scan = (time.perf_counter() - start) / 20
+
+            start = time.perf_counter()
+            for query in queries:
+                storage.search_books(query)
+            index = (time.perf_counter() - start) / SEARCHES
+
+            print(f"{backend:>8} {size:>10} {scan * 1e3:>10.2f} {index * 1e3:>11.2f}")
+
+
+def bench_load():
+    print(f"{'Backend':>8} {'Records':>10} {'File (MB)':>10} {'Startup (ms)':>13} {'Peak (MB)':>10} {'Held (MB)':>10}")
+    for backend in [".json", ".jsonl", ".lsnap", ".db"]:
+        for size in [10_000, 100_000, 1_000_000]:
+            database = os.path.join(workdir, f"load-{size}{backend}")
+            seed(database, size)
+            gc.collect()
+
+            # Time to open the library and serve a first lookup
+            start = time.perf_counter()
+            storage = open_storage(database)
+            storage.get_book(f"B-{size // 2:07d}")
+            startup = time.perf_counter() - start
+            del storage
+            gc.collect()
+
+            # tracemalloc sees Python objects only, not SQLite's page cache
+            tracemalloc.start()
+            storage = open_storage(database)
+            storage.get_book(f"B-{size // 2:07d}")
+            held, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del storage
+
+            file_size = os.path.getsize(database) / 2**20
+            print(f"{backend:>8} {size:>10} {file_size:>10.1f} {startup * 1e3:>13.1f} {peak / 2**20:>10.1f} {held / 2**20:>10.1f}")
+
+
+def bench_cart():
+    # A 50-book return cart: one call per book versus one batch
+    print(f"{'Backend':>8} {'Books':>10} {'One by one (ms)':>16} {'Batch (ms)':>11}")
+    for backend in BACKENDS:
+        for size in [10_000, 100_000]:
+            storage = seed(os.path.join(workdir, f"cart-{size}{backend}"), size)
+            member_id = "M-0000000"
+            loans = [(member_id, Loan(f"B-{i:07d}", make_title(i), now())) for i in range(CART)]
+
+            storage.borrow_many(loans)
+            start = time.perf_counter()
+            for _, loan in loans:
+                storage.return_book(member_id, loan)
+            single = time.perf_counter() - start
+
+            storage.borrow_many(loans)
+            start = time.perf_counter()
+            storage.return_many(loans)
+            batch = time.perf_counter() - start
+
+            print(f"{backend:>8} {size:>10} {single * 1e3:>16.1f} {batch * 1e3:>11.1f}")
+
+
+def stress_worker(database, seed_value, members=50, books=20, operations=OPERATIONS):
+    # One process: several threads sharing one storage, like Streamlit
+    # sessions, borrowing and returning the same few books. Returns the
+    # number of changes made and refused, and any exceptions raised
+    storage = open_storage(database)
+    done = [0, 0]
+    errors = []
+
+    def run(rng):
+        try:
+            for _ in range(operations):
+                member_id = f"M-{rng.randrange(members):07d}"
+                member = storage.get_member(member_id)
+                if member.borrowed and rng.random() < 0.5:
+                    ok = storage.return_book(member_id, rng.choice(member.borrowed))
+                else:
+                    book = storage.get_book(f"B-{rng.randrange(books):07d}")
+                    ok = storage.borrow(member_id, Loan(book.id, book.title, now()))
+                done[0 if ok else 1] += 1
+        except Exception as e:
+            errors.append(repr(e))
+
+    threads = [threading.Thread(target=run, args=(random.Random(seed_value * 100 + i),)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return done, errors
+
+
+def bench_stress():
+    print(f"{'Backend':>8} {'Ops':>8} {'Ops/s':>8} {'Refused':>8} {'Errors':>7} {'Copies':>9}")
+    for backend in BACKENDS + [".jsonl", ".lsnap"]:
+        database = os.path.join(workdir, f"stress{backend}")
+        seed(database, 20, 50)
+
+        start = time.perf_counter()
+        # Fresh processes like separate CLI/Streamlit runs; forked ones would
+        # inherit this process's open SQLite connections, which is unsafe
+        with multiprocessing.get_context("spawn").Pool(PROCESSES) as pool:
+            results = pool.starmap(stress_worker, [(database, i) for i in range(PROCESSES)])
+        elapsed = time.perf_counter() - start
+        succeeded = sum(done[0] for done, errors in results)
+        refused = sum(done[1] for done, errors in results)
+        errors = sum(len(errors) for done, errors in results)
+
+        correct = not drifted_books(open_storage(database))
+        total = succeeded + refused
+        print(
+            f"{backend:>8} {total:>8} {total / elapsed:>8.0f} {refused:>8} {errors:>7} "
+            f"{'ok' if correct else 'DRIFTED':>9}"
+        )
+
+
+BENCHMARKS = {
+    "circulation": bench_circulation,
+    "search": bench_search,
+    "load": bench_load,
+    "cart": bench_cart,
+    "stress": bench_stress,
+}
+
+
+if __name__ == "__main__":
+    workdir = tempfile.mkdtemp(prefix="library-bench-")
+    atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"\n== {name} ==")
+        BENCHMARKS[name]()
@@ -0,0 +1,139 @@
+import csv
+import json
+import sys
+import time
+from pathlib import Path
+
+from library_core import Book, Library, now
+from library_core.records import parse_timestamp
+
+BATCH_SIZE = 5_000
+CSV_COLUMNS = ["id", "title", "author", "available_copies", "total_copies", "added_on"]
+MAX_ERRORS_SHOWN = 20
+
+
+def read_rows(path):
+    # Yields (line number, row dict) without reading the whole file
+    with open(path, newline="", encoding="utf-8") as f:
+        if Path(path).suffix == ".jsonl":
+            for number, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        yield number, json.loads(line)
+                    except ValueError:
+                        yield number, None
+        else:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+
+
+def field(row, name, default):
+    # Empty CSV cells count as missing
+    value = row.get(name)
+    return default if value is None or value == "" else value
+
+
+def whole_number(value):
+    # int() would quietly turn 2.7 from a JSON file into 2, and true into 1
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(value)
+    return int(value)
+
+
+def to_book(library, row, taken, imported_on):
+    # Returns a Book, or raises ValueError saying what is wrong with the row
+    if not isinstance(row, dict):
+        raise ValueError("not a JSON object")
+    title = str(row.get("title") or "").strip()
+    author = str(row.get("author") or "").strip()
+    if not title or not author:
+        raise ValueError("title and author are required")
+
+    try:
+        total = whole_number(field(row, "total_copies", field(row, "copies", 1)))
+        available = whole_number(field(row, "available_copies", total))
+    except (TypeError, ValueError):
+        raise ValueError("copies must be whole numbers")
+    if total < 1 or not 0 <= available <= total:
+        raise ValueError("copies out of range")
+
+    # Rows without an id get one when their batch is written
+    book_id = str(row.get("id") or "").strip() or None
+    if book_id and (book_id in taken or library.get_book(book_id)):
+        raise ValueError(f"duplicate id {book_id}")
+
+    added_on = parse_timestamp(row["added_on"]) if row.get("added_on") else imported_on
+    return Book(book_id, title, author, available, total, added_on)
+
+
+def import_books(library, path, batch_size=BATCH_SIZE):
+    imported = rejected = 0
+    start = time.perf_counter()
+    batch = []
+    taken = set()
+    imported_on = now()
+
+    def flush():
+        nonlocal imported
+        unnamed = [book for book in batch if book.id is None]
+        for book, book_id in zip(unnamed, library.generate_ids(len(unnamed))):
+            book.id = book_id
+        # One journal entry / one transaction per batch
+        library.add_books(batch)
+        imported += len(batch)
+        batch.clear()
+        taken.clear()
+        elapsed = time.perf_counter() - start
+        print(f"  {imported} books imported ({imported / elapsed:,.0f}/s)")
+
+    for number, row in read_rows(path):
+        try:
+            book = to_book(library, row, taken, imported_on)
+        except ValueError as e:
+            rejected += 1
+            if rejected <= MAX_ERRORS_SHOWN:
+                print(f"  line {number}: {e}", file=sys.stderr)
+            continue
+        batch.append(book)
+        if book.id:
+            taken.add(book.id)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    library.save_data()
+    elapsed = time.perf_counter() - start
+    print(f"Imported {imported} books, rejected {rejected}, in {elapsed:.1f}s ({imported / max(elapsed, 1e-9):,.0f}/s)")
+    return imported, rejected
+
+
+def export_books(library, path):
+    exported = 0
+    start = time.perf_counter()
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if Path(path).suffix == ".jsonl":
+            for book in library.get_all_books():
+                f.write(json.dumps(book.to_dict(), separators=(",", ":")) + "\n")
+                exported += 1
+        else:
+            writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+            writer.writeheader()
+            for book in library.get_all_books():
+                writer.writerow(book.to_dict())
+                exported += 1
+    elapsed = time.perf_counter() - start
+    print(f"Exported {exported} books in {elapsed:.1f}s ({exported / max(elapsed, 1e-9):,.0f}/s)")
+    return exported
+
+
+if __name__ == "__main__":
+    # python bulk.py import books.csv | python bulk.py export books.jsonl
+    if len(sys.argv) != 3 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python bulk.py import|export <file.csv|file.jsonl>")
+        sys.exit(1)
+    if sys.argv[1] == "import":
+        import_books(Library(), sys.argv[2])
+    else:
+        export_books(Library(), sys.argv[2])
@@ -0,0 +1,3 @@
+from .library import Library
+from .records import Book, Loan, Member, format_timestamp, now
+from .storage import copy_storage, open_storage
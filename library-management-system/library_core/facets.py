@@ -0,0 +1,85 @@
+import heapq
+from bisect import bisect_left, insort
+from itertools import islice
+
+# Facet lists remembered between reruns, see FacetIndex.facets
+TOP_KEEP = 256
+
+
+class FacetIndex:
+    """Books by author and the set of books with a copy on the shelf, kept
+    current on add, borrow and return so browsing never scans the catalogue.
+
+    Built from (book id, author, available copies) rows. Dicts with None
+    values serve as insertion-ordered sets of book ids.
+    """
+
+    def __init__(self, rows):
+        self.by_author = {}            # author -> {book id: None}
+        self.available = {}            # book ids with available_copies > 0
+        self.available_by_author = {}  # author -> number of those books
+        self.names = None              # sorted (casefolded author, author), for prefix lookups
+        self.top = {}                  # (prefix, limit) -> authors with the most books
+        for row in rows:
+            self.insert(*row)
+        self.names = sorted((author.casefold(), author) for author in self.by_author)
+
+    def add(self, book):
+        self.insert(book.id, book.author, book.available_copies)
+
+    def insert(self, book_id, author, available_copies):
+        if author not in self.by_author and self.names is not None:
+            insort(self.names, (author.casefold(), author))
+        # Book counts only change here; availability is looked up per call
+        self.top.clear()
+        self.by_author.setdefault(author, {})[book_id] = None
+        self.available_by_author.setdefault(author, 0)
+        if available_copies > 0:
+            self.available[book_id] = None
+            self.available_by_author[author] += 1
+
+    def update(self, book):
+        # Call after available_copies changed; only 0 <-> 1 matters
+        if book.available_copies > 0 and book.id not in self.available:
+            self.available[book.id] = None
+            self.available_by_author[book.author] += 1
+        elif book.available_copies <= 0 and book.id in self.available:
+            del self.available[book.id]
+            self.available_by_author[book.author] -= 1
+
+    def matching(self, prefix):
+        i = bisect_left(self.names, (prefix,))
+        while i < len(self.names) and self.names[i][0].startswith(prefix):
+            yield self.names[i][1]
+            i += 1
+
+    def facets(self, prefix="", limit=50):
+        # (author, books, books in stock), most books first. Only authors in
+        # the prefix's range are ranked, and the ranking is kept until the
+        # next book is added, so reruns of the same browse are O(limit)
+        key = (prefix.casefold(), limit)
+        top = self.top.get(key)
+        if top is None:
+            if len(self.top) >= TOP_KEEP:
+                self.top.clear()
+            authors = self.matching(key[0])
+            top = self.top[key] = heapq.nlargest(limit, authors, key=lambda author: len(self.by_author[author]))
+        return [(author, len(self.by_author[author]), self.available_by_author[author]) for author in top]
+
+    def book_ids(self, author=None, available_only=False):
+        if author is None:
+            return iter(self.available) if available_only else None
+        ids = self.by_author.get(author, {})
+        if available_only:
+            return (book_id for book_id in ids if book_id in self.available)
+        return iter(ids)
+
+    def page(self, author=None, available_only=False, offset=0, limit=50):
+        return list(islice(self.book_ids(author, available_only), offset, offset + limit))
+
+    def count(self, author=None, available_only=False):
+        if author is None:
+            return len(self.available) if available_only else None
+        if available_only:
+            return self.available_by_author.get(author, 0)
+        return len(self.by_author.get(author, {}))
@@ -0,0 +1,67 @@
+import os
+import random
+import string
+import threading
+import time
+
+DIGITS = string.digits + string.ascii_uppercase
+
+# Ids count milliseconds from here; 8 base-36 digits last about 89 years
+EPOCH_MS = 1_735_689_600_000   # 2025-01-01 00:00 UTC
+WIDTH = 8
+NODE_WIDTH = 2
+
+
+def encode(number, width=WIDTH):
+    chars = []
+    for _ in range(width):
+        number, digit = divmod(number, 36)
+        chars.append(DIGITS[digit])
+    return "".join(reversed(chars))
+
+
+class IdAllocator:
+    """Hands out time-ordered ids like ``B-0PQ3Z1KD7F``: a prefix, the
+    allocation time in base-36 milliseconds and two characters picked at
+    random for this process.
+
+    Every id is one tick past the previous one even within the same
+    millisecond, so ids from one process never repeat and sort in
+    allocation order. A batch reserves its ticks ahead of the clock; the
+    process characters keep another process that reaches the same ticks
+    from producing the same ids. Ids that already exist (e.g. old random
+    ids, or ones handed out before a clock change) are skipped, and the
+    storage checks again under its lock before writing.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.node = encode(random.SystemRandom().randrange(36 ** NODE_WIDTH), NODE_WIDTH)
+        self.last = 0
+        self.lock = threading.Lock()
+
+    def allocate(self, count, exists):
+        ids = []
+        while len(ids) < count:
+            # Reserve a whole run of ticks at once, then drop any that are taken
+            wanted = count - len(ids)
+            with self.lock:
+                start = max(self.last + 1, int(time.time() * 1000) - EPOCH_MS)
+                self.last = start + wanted - 1
+            for tick in range(start, start + wanted):
+                new_id = f"{self.prefix}-{encode(tick)}{self.node}"
+                if not exists(new_id):
+                    ids.append(new_id)
+        return ids
+
+
+# One allocator per prefix for the whole process, shared by every Library.
+# Keyed by pid too, so a forked child does not inherit its parent's.
+ALLOCATORS = {}
+
+
+def allocator(prefix):
+    key = (prefix, os.getpid())
+    if key not in ALLOCATORS:
+        ALLOCATORS.setdefault(key, IdAllocator(prefix))
+    return ALLOCATORS[key]
@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+from .snapshot import snapshot_format
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# The log is folded into a new snapshot once it grows past the snapshot
+# itself (and past a floor, so small libraries are not rewritten often)
+COMPACT_RATIO = 1.0
+COMPACT_MIN_BYTES = 1 << 20
+
+
+class FileLock:
+    """Exclusive lock shared by the threads of this process and by other
+    processes using the same database. Re-entrant within a thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.file = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if self.depth == 0:
+            if self.file is None:
+                self.file = open(self.path, "a+b")
+            if fcntl:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+            else:
+                self.file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        pass
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.depth -= 1
+        if self.depth == 0:
+            if fcntl:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        self.thread_lock.release()
+
+
+class Journal:
+    """Append-only log of Library mutations on top of a snapshot file.
+
+    Every mutation is written as one compact line to ``<database>.log``.
+    On startup the snapshot is loaded and the log is replayed over it. Once
+    the log is larger than the snapshot, the in-memory data is written back
+    as a fresh snapshot and the log starts over, so a rewrite of the whole
+    library happens only after as many bytes have been appended.
+
+    Several processes can share one database: whoever holds ``lock`` first
+    catches up on entries the others appended (or reloads, if one of them
+    wrote a new snapshot) before changing anything.
+    """
+
+    def __init__(self, database):
+        self.snapshot = Path(database)
+        self.log = self.snapshot.with_name(self.snapshot.name + ".log")
+        self.format = snapshot_format(database)
+        self.lock = FileLock(self.snapshot.with_name(self.snapshot.name + ".lock"))
+        self.seq = 0        # sequence number of the last applied entry
+        self.pending = 0    # entries written to the log since the last snapshot
+        self.offset = 0     # bytes of the log applied so far
+        self.stamp = None   # identity of the snapshot that was loaded
+
+    def load_snapshot(self):
+        # Ensure directory exists
+        self.snapshot.parent.mkdir(parents=True, exist_ok=True)
+
+        # Load existing snapshot or create an empty one
+        if not self.snapshot.exists():
+            self.format.write(self.snapshot, [], [], 0)
+
+        # Entries up to journal_seq are already part of the snapshot
+        books, members, self.seq = self.format.load(self.snapshot)
+        self.stamp = self.snapshot_stamp()
+        self.offset = 0
+        self.pending = 0
+        return books, members
+
+    def snapshot_stamp(self):
+        stat = self.snapshot.stat()
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def log_size(self):
+        try:
+            return self.log.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def snapshot_replaced(self):
+        # Another process compacted: its snapshot replaced ours and the log restarted
+        return self.snapshot_stamp() != self.stamp or self.log_size() < self.offset
+
+    def wants_compaction(self):
+        # Replaying a log larger than the snapshot costs more than loading it
+        return self.offset > max(self.stamp[2] * COMPACT_RATIO, COMPACT_MIN_BYTES)
+
+    def changed(self):
+        return self.snapshot_replaced() or self.log_size() != self.offset
+
+    def replay(self, apply):
+        # Applies entries past ``offset``; callers hold ``lock``, so nobody
+        # is halfway through writing one
+        if not self.log.exists():
+            return
+
+        good_until = self.offset
+        with open(self.log, "rb") as f:
+            f.seek(self.offset)
+            for line in f:
+                # A line without its newline is a write torn by a crash
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                good_until += len(line)
+                if entry["seq"] <= self.seq:
+                    continue
+                apply(entry)
+                self.seq = entry["seq"]
+                self.pending += 1
+        self.offset = good_until
+
+        # Drop the torn tail so new entries start on a clean line
+        if good_until < self.log.stat().st_size:
+            with open(self.log, "r+b") as f:
+                f.truncate(good_until)
+
+    def append(self, entry):
+        self.seq += 1
+        entry["seq"] = self.seq
+        line = json.dumps(entry, separators=(",", ":"), default=str) + "\n"
+        with open(self.log, "ab") as f:
+            self.offset += f.write(line.encode())
+            f.flush()
+            os.fsync(f.fileno())
+        self.pending += 1
+
+    def compact(self, books, members):
+        self.format.write(self.snapshot, books, members, self.seq)
+
+        # The snapshot now covers every logged entry, start a fresh log
+        with open(self.log, "wb") as f:
+            os.fsync(f.fileno())
+        self.stamp = self.snapshot_stamp()
+        self.offset = 0
+        self.pending = 0
@@ -0,0 +1,162 @@
+import os
+
+from .ids import allocator
+from .records import Book, Loan, Member, now
+from .storage import LazyStorage, open_storage
+
+DEFAULT_DATABASE = "library-management/data.json"
+
+
+class Library:
+    """Everything the CLI and the Streamlit app do to the library. The
+    front ends only collect input and show results."""
+
+    def __init__(self, database=None, opener=open_storage):
+        # A .db/.sqlite path switches to the SQLite backend, .jsonl to lazily loaded JSON lines,
+        # .lsnap to the binary column snapshot
+        self.database = database or os.environ.get("LIBRARY_DATABASE", DEFAULT_DATABASE)
+        self.storage = LazyStorage(self.database, opener)
+
+    def generate_id(self, prefix="B"):
+        return self.generate_ids(1, prefix)[0]
+
+    def generate_ids(self, count, prefix="B"):
+        # Checked against the existing books/members so an id is never reused
+        lookup = self.get_book if prefix == "B" else self.get_member
+        return allocator(prefix).allocate(count, lambda new_id: lookup(new_id) is not None)
+
+    def save_data(self):
+        self.storage.save()
+
+    def refresh(self):
+        # Pick up changes made by other sessions or processes
+        self.storage.refresh()
+
+    def get_book(self, book_id):
+        return self.storage.get_book(book_id)
+
+    def get_member(self, member_id):
+        return self.storage.get_member(member_id)
+
+    def add_book(self, title, author, copies):
+        book = Book(self.generate_id(), title, author, copies, copies, now())
+        self.storage.add_book(book)
+        return book.id
+
+    def add_books(self, books):
+        self.storage.add_books(books)
+
+    def get_all_books(self):
+        return self.storage.iter_books()
+
+    def page_books(self, offset, limit):
+        return self.storage.page_books(offset, limit)
+
+    def count_books(self):
+        return self.storage.count_books()
+
+    def total_copies(self):
+        return self.storage.total_copies()
+
+    def recent_books(self, limit):
+        return self.storage.recent_books(limit)
+
+    def search_books(self, query, limit=50):
+        # An exact ID goes first, then title/author matches
+        book = self.get_book(query.strip())
+        matches = self.storage.search_books(query, limit)
+        if book:
+            return [book] + [b for b in matches if b.id != book.id]
+        return matches
+
+    def author_facets(self, prefix="", limit=50):
+        # (author, books, books in stock), most books first
+        return self.storage.author_facets(prefix, limit)
+
+    def facet_books(self, author=None, available_only=False, offset=0, limit=50):
+        return self.storage.facet_books(author, available_only, offset, limit)
+
+    def count_facet(self, author=None, available_only=False):
+        return self.storage.count_facet(author, available_only)
+
+    def add_member(self, name, email):
+        member = Member(self.generate_id("M"), name, email)
+        self.storage.add_member(member)
+        return member.id
+
+    def get_all_members(self):
+        return self.storage.iter_members()
+
+    def get_borrowers(self):
+        return self.storage.iter_borrowers()
+
+    def page_members(self, offset, limit):
+        return self.storage.page_members(offset, limit)
+
+    def count_members(self):
+        return self.storage.count_members()
+
+    def search_members(self, query, limit=50, borrowers_only=False):
+        # An exact ID goes first, then name/email matches
+        member = self.get_member(query.strip())
+        matches = self.storage.search_members(query, limit, borrowers_only)
+        if member and (member.borrowed or not borrowers_only):
+            return [member] + [m for m in matches if m.id != member.id]
+        return matches
+
+    def loans_for_book(self, book_id):
+        # (member id, Loan) for every copy of the book that is out
+        return self.storage.loans_for_book(book_id)
+
+    def overdue_loans(self, today, limit=None):
+        return self.storage.overdue_loans(today, limit)
+
+    def borrow_book(self, member_id, book_id):
+        member = self.get_member(member_id)
+        if not member:
+            return False, "Member not found"
+
+        book = self.get_book(book_id)
+        if not book:
+            return False, "Book not found"
+
+        if book.available_copies <= 0:
+            return False, "No copies available"
+
+        borrow_entry = Loan(book.id, book.title, now())
+        # Another session may have taken the last copy in the meantime
+        if not self.storage.borrow(member.id, borrow_entry):
+            return False, "No copies available"
+        return True, f"Book '{book.title}' borrowed successfully!"
+
+    def return_book(self, member_id, loan):
+        # loan is the entry of member.borrowed the user picked
+        if not self.get_member(member_id):
+            return False, "Member not found"
+
+        if not self.storage.return_book(member_id, loan):
+            return False, "Book was already returned"
+        return True, f"Book '{loan.title}' returned successfully!"
+
+    def borrow_many(self, pairs):
+        # (member_id, book_id) pairs, borrowed all together or not at all
+        loans = []
+        for member_id, book_id in pairs:
+            if not self.get_member(member_id):
+                return False, f"Member {member_id} not found"
+            book = self.get_book(book_id)
+            if not book:
+                return False, f"Book {book_id} not found"
+            loans.append((member_id, Loan(book.id, book.title, now())))
+
+        if not self.storage.borrow_many(loans):
+            return False, "Not enough copies available"
+        return True, f"{len(loans)} book(s) borrowed successfully!"
+
+    def return_many(self, pairs):
+        # (member_id, loan) pairs, returned all together or not at all
+        if not pairs:
+            return False, "Nothing selected"
+        if not self.storage.return_many(pairs):
+            return False, "Some of these books were already returned"
+        return True, f"{len(pairs)} book(s) returned successfully!"
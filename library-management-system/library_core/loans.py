@@ -0,0 +1,93 @@
+import heapq
+
+from .records import Loan
+
+
+class LoanIndex:
+    """Every open loan by book and by due date, built from the members'
+    ``borrowed`` lists for backends that have no loans table.
+
+    A loan is keyed by (due on, member id, book id, borrowed on, title).
+    Two loans with the same key cannot be told apart, so keys are counted
+    rather than stored once each.
+
+    Loans wait in a min-heap ordered by due date; each scan pops the ones
+    that have come due into ``overdue``, so an overdue query only touches
+    the loans it returns.
+    """
+
+    def __init__(self):
+        self.by_book = {}    # book id -> {key: count}
+        self.due = []        # heap of keys not yet seen overdue, may hold returned loans
+        self.overdue = {}    # key -> count, for loans found overdue by scan()
+        self.stale = 0       # returned loans still sitting in the heap
+        self.borrowers = {}  # member id -> number of open loans, in first-loan order
+
+    def add(self, member_id, loan):
+        key = (loan.due_on, member_id, loan.book_id, loan.borrowed_on, loan.title)
+        keys = self.by_book.setdefault(loan.book_id, {})
+        keys[key] = keys.get(key, 0) + 1
+        self.borrowers[member_id] = self.borrowers.get(member_id, 0) + 1
+        # Unreadable due dates cannot be ordered, so they never come due
+        if isinstance(loan.due_on, int):
+            heapq.heappush(self.due, key)
+
+    def remove(self, member_id, loan):
+        key = (loan.due_on, member_id, loan.book_id, loan.borrowed_on, loan.title)
+        keys = self.by_book[loan.book_id]
+        keys[key] -= 1
+        if not keys[key]:
+            del keys[key]
+            if not keys:
+                del self.by_book[loan.book_id]
+        self.borrowers[member_id] -= 1
+        if not self.borrowers[member_id]:
+            del self.borrowers[member_id]
+
+        if self.overdue.get(key, 0) > keys.get(key, 0):
+            self.overdue[key] -= 1
+            if not self.overdue[key]:
+                del self.overdue[key]
+        elif isinstance(loan.due_on, int):
+            # Left in the heap; rebuild once returned loans make up half of it
+            self.stale += 1
+            if self.stale * 2 > len(self.due):
+                self.rebuild_heap()
+
+    def rebuild_heap(self):
+        self.due = [
+            key
+            for keys in self.by_book.values()
+            for key, count in keys.items()
+            if isinstance(key[0], int)
+            for _ in range(count - self.overdue.get(key, 0))
+        ]
+        heapq.heapify(self.due)
+        self.stale = 0
+
+    def scan(self, now):
+        while self.due and self.due[0][0] < now:
+            key = heapq.heappop(self.due)
+            count = self.by_book.get(key[2], {}).get(key, 0)
+            if self.overdue.get(key, 0) < count:
+                self.overdue[key] = self.overdue.get(key, 0) + 1
+            else:
+                self.stale -= 1
+
+    def overdue_loans(self, now, limit=None):
+        self.scan(now)
+        # An earlier scan may have run with a later now
+        keys = (key for key in self.overdue if key[0] < now)
+        # Each key is at least one loan, so the limit smallest keys are enough
+        keys = sorted(keys) if limit is None else heapq.nsmallest(limit, keys)
+        loans = [as_loan(key) for key in keys for _ in range(self.overdue[key])]
+        return loans[:limit]
+
+    def on_loan(self, book_id):
+        keys = self.by_book.get(book_id, {})
+        return [loan for key, count in keys.items() for loan in [as_loan(key)] * count]
+
+
+def as_loan(key):
+    due_on, member_id, book_id, borrowed_on, title = key
+    return member_id, Loan(book_id, title, borrowed_on, due_on)
@@ -0,0 +1,123 @@
+# Compact in-memory records for books, members and loans. to_dict() and
+# from_dict() convert to and from the data.json schema without loss.
+import sys
+from datetime import datetime, timedelta
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+EPOCH = datetime(1970, 1, 1)
+EPOCH_DAY = EPOCH.toordinal()
+LOAN_DAYS = 14
+
+
+def now():
+    # Local wall-clock time, stored the same way as parsed timestamps
+    return parse_timestamp(datetime.now().strftime(TIME_FORMAT))
+
+
+def parse_timestamp(text):
+    # "YYYY-MM-DD HH:MM:SS" -> whole seconds, read as naive wall-clock time so
+    # that formatting gives back exactly the same string
+    try:
+        moment = datetime.fromisoformat(text)
+    except (TypeError, ValueError):
+        return text
+    stamp = (moment.toordinal() - EPOCH_DAY) * 86400 + moment.hour * 3600 + moment.minute * 60 + moment.second
+    if len(text) == 19 and text[10] == " ":
+        return stamp
+    # Anything that would not survive the round trip is kept as it was
+    return stamp if format_timestamp(stamp) == text else text
+
+
+def format_timestamp(stamp):
+    if isinstance(stamp, str):
+        return stamp
+    if stamp is None:
+        return "unknown"
+    return (EPOCH + timedelta(seconds=stamp)).strftime(TIME_FORMAT)
+
+
+class Book:
+    __slots__ = ("id", "title", "author", "available_copies", "total_copies", "added_on")
+
+    def __init__(self, id, title, author, available_copies, total_copies, added_on):
+        self.id = id
+        self.title = sys.intern(title)
+        self.author = sys.intern(author)
+        self.available_copies = available_copies
+        self.total_copies = total_copies
+        self.added_on = added_on
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["id"],
+            data["title"],
+            data["author"],
+            data["available_copies"],
+            data["total_copies"],
+            parse_timestamp(data["added_on"]),
+        )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "title": self.title,
+            "author": self.author,
+            "available_copies": self.available_copies,
+            "total_copies": self.total_copies,
+            "added_on": format_timestamp(self.added_on),
+        }
+
+
+class Loan:
+    __slots__ = ("book_id", "title", "borrowed_on", "due_on")
+
+    def __init__(self, book_id, title, borrowed_on, due_on=None):
+        self.book_id = book_id
+        self.title = sys.intern(title)
+        self.borrowed_on = borrowed_on
+        # Loans from before due dates existed get the standard loan period
+        if due_on is None and isinstance(borrowed_on, int):
+            due_on = borrowed_on + LOAN_DAYS * 86400
+        self.due_on = due_on
+
+    @classmethod
+    def from_dict(cls, data):
+        # Works for plain dicts and sqlite3.Row alike
+        due_on = data["due_on"] if "due_on" in data.keys() else None
+        return cls(
+            data["book_id"],
+            data["title"],
+            parse_timestamp(data["borrowed_on"]),
+            parse_timestamp(due_on) if due_on is not None else None,
+        )
+
+    def to_dict(self):
+        return {
+            "book_id": self.book_id,
+            "title": self.title,
+            "borrowed_on": format_timestamp(self.borrowed_on),
+            "due_on": format_timestamp(self.due_on) if self.due_on is not None else None,
+        }
+
+
+class Member:
+    __slots__ = ("id", "name", "email", "borrowed")
+
+    def __init__(self, id, name, email, borrowed=None):
+        self.id = id
+        self.name = name
+        self.email = email
+        self.borrowed = borrowed if borrowed is not None else []
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["id"], data["name"], data["email"], [Loan.from_dict(loan) for loan in data.get("borrowed", [])])
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "email": self.email,
+            "borrowed": [loan.to_dict() for loan in self.borrowed],
+        }
@@ -0,0 +1,126 @@
+import heapq
+import re
+import sys
+from bisect import bisect_left, insort
+
+WORD = re.compile(r"\w+")
+
+# Title hits rank above author hits, whole-word hits above prefix hits
+TITLE_WEIGHT = 2
+AUTHOR_WEIGHT = 1
+EXACT_BONUS = 2
+BEST_TERM_SCORE = TITLE_WEIGHT * EXACT_BONUS
+
+
+def tokenize(text):
+    return WORD.findall(text.lower())
+
+
+def words_of(text):
+    # Interned, so records with the same words share the strings
+    return tuple(map(sys.intern, tokenize(text)))
+
+
+class SearchIndex:
+    """Inverted index from the words of two text fields to record ids:
+    title/author for books, name/email for members.
+
+    Every query word matches index words it is a prefix of, and a record
+    has to match all query words to be returned. Matches in the first
+    field rank above matches in the second.
+    """
+
+    def __init__(self, records=()):
+        # records: (id, first field, second field) to start with
+        self.postings = {}     # word -> set of record ids
+        self.record_words = {}   # record id -> (title words, author words)
+        # Titles and authors repeat, so each distinct text is split only once
+        split = {}
+        for record_id, title, author in records:
+            title_words = split.get(title)
+            if title_words is None:
+                title_words = split[title] = words_of(title)
+            author_words = split.get(author)
+            if author_words is None:
+                author_words = split[author] = words_of(author)
+            self.index(record_id, title_words, author_words)
+        self.words = sorted(self.postings)   # sorted vocabulary, for prefix lookups
+
+    def add(self, record_id, title, author):
+        for word in self.index(record_id, words_of(title), words_of(author)):
+            insort(self.words, word)
+
+    def index(self, record_id, title_words, author_words):
+        # Returns the words the index did not have yet
+        self.record_words[record_id] = (title_words, author_words)
+        postings = self.postings
+        new_words = []
+        for word in title_words + author_words:
+            posting = postings.get(word)
+            if posting is None:
+                posting = postings[word] = set()
+                new_words.append(word)
+            posting.add(record_id)
+        return new_words
+
+    def expand(self, prefix):
+        i = bisect_left(self.words, prefix)
+        while i < len(self.words) and self.words[i].startswith(prefix):
+            yield self.words[i]
+            i += 1
+
+    def score(self, record_id, terms):
+        title_words, author_words = self.record_words[record_id]
+        total = 0
+        for term in terms:
+            if term in title_words:
+                total += TITLE_WEIGHT * EXACT_BONUS
+                continue
+            best = AUTHOR_WEIGHT * EXACT_BONUS if term in author_words else 0
+            if best < TITLE_WEIGHT and any(word.startswith(term) for word in title_words):
+                best = TITLE_WEIGHT
+            if not best and any(word.startswith(term) for word in author_words):
+                best = AUTHOR_WEIGHT
+            if not best:
+                return 0
+            total += best
+        return total
+
+    def search(self, query, limit=50, keep=None):
+        # keep(record id), if given, drops records before they count towards the limit
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        # Candidates come from the term with the fewest postings, the
+        # other terms are checked against each candidate's own words
+        expansions = {term: list(self.expand(term)) for term in terms}
+        driver = min(terms, key=lambda term: sum(len(self.postings[w]) for w in expansions[term]))
+        others = (len(terms) - 1) * BEST_TERM_SCORE
+
+        # Whole-word hits go first; after them no record can score above
+        # a title prefix hit, so a full page at that score ends the scan
+        words = sorted(expansions[driver], key=lambda word: word != driver)
+        ceiling = BEST_TERM_SCORE + others
+        scores = {}
+        at_ceiling = 0
+        for word in words:
+            if word != driver and ceiling > TITLE_WEIGHT + others:
+                ceiling = TITLE_WEIGHT + others
+                at_ceiling = sum(1 for score in scores.values() if score >= ceiling)
+            for record_id in self.postings[word]:
+                if record_id in scores:
+                    continue
+                if keep is not None and not keep(record_id):
+                    scores[record_id] = 0
+                    continue
+                score = scores[record_id] = self.score(record_id, terms)
+                if score >= ceiling:
+                    at_ceiling += 1
+                    if at_ceiling >= limit:
+                        break
+            if at_ceiling >= limit:
+                break
+
+        best = heapq.nlargest(limit, ((s, record_id) for record_id, s in scores.items() if s), key=lambda x: x[0])
+        return [record_id for score, record_id in best]
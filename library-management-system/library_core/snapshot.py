@@ -0,0 +1,509 @@
+import json
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from itertools import chain, islice
+from operator import attrgetter
+from pathlib import Path
+
+from .records import Book, Loan, Member
+
+# to_dict() puts "id" first, so the loader can find ids without parsing
+RECORD_START = b'{"id":"'
+ID_AT = len(RECORD_START)
+SECTION_LINE = b'{"section":"%s"}\n'
+READ_SIZE = 4096
+SCAN_SIZE = 1 << 20
+
+
+def snapshot_format(path):
+    # data.jsonl holds one record per line and is loaded lazily, data.lsnap
+    # is the binary column layout
+    if Path(path).suffix == ".jsonl":
+        return JsonLinesSnapshot()
+    if Path(path).suffix == ".lsnap":
+        return ColumnSnapshot()
+    return JsonSnapshot()
+
+
+def write_temp(path, write):
+    # Write next to the snapshot first so a crash never leaves half a file
+    tmp = Path(path).with_name(Path(path).name + ".tmp")
+    with open(tmp, "wb") as f:
+        result = write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp, result
+
+
+class JsonSnapshot:
+    """The original data.json layout, parsed in full on load."""
+
+    def load(self, path):
+        with open(path, "r") as f:
+            content = f.read().strip()
+        data = json.loads(content) if content else {}
+        books = Records((b["id"], Book.from_dict(b)) for b in data.get("books", []))
+        members = Records((m["id"], Member.from_dict(m)) for m in data.get("members", []))
+        return books, members, data.get("journal_seq", 0)
+
+    def write(self, path, books, members, seq):
+        data = {
+            "books": [book.to_dict() for book in books],
+            "members": [member.to_dict() for member in members],
+            "journal_seq": seq,
+        }
+        tmp, _ = write_temp(path, lambda f: f.write(json.dumps(data, indent=4, default=str).encode()))
+        os.replace(tmp, path)
+
+
+class Records(dict):
+    """id -> record mapping for snapshots that are loaded in full."""
+
+    def page(self, offset, limit):
+        return list(islice(self.values(), offset, offset + limit))
+
+    def rows(self, *names):
+        # (id, *fields) per record, see LazyRecords.rows
+        return map(attrgetter("id", *names), self.values())
+
+    peek = dict.get
+
+
+class LazyRecords:
+    """id -> record mapping over byte offsets into a JSON-lines snapshot.
+
+    A record is parsed the first time it is looked up and then stays in
+    memory, so in-place changes stick until the next snapshot. Records
+    added since the snapshot have no offset yet.
+
+    ``scan(offsets, names)``, where the snapshot has one, yields (id,
+    *fields) for the records stored in it, in offset order, without
+    building them. Only text and number fields can be scanned; timestamps
+    are stored formatted.
+    """
+
+    def __init__(self, read, offsets, scan=None):
+        self.read = read
+        self.offsets = offsets
+        self.scan = scan
+        self.loaded = {}
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, record_id):
+        return record_id in self.offsets
+
+    def __iter__(self):
+        return iter(self.offsets)
+
+    def __getitem__(self, record_id):
+        record = self.loaded.get(record_id)
+        if record is None:
+            record = self.loaded[record_id] = self.read(self.offsets[record_id])
+        return record
+
+    def __setitem__(self, record_id, record):
+        self.loaded[record_id] = record
+        self.offsets.setdefault(record_id, None)
+
+    def get(self, record_id, default=None):
+        return self[record_id] if record_id in self.offsets else default
+
+    def peek(self, record_id):
+        # Like get(), but a record that is not loaded yet is not kept
+        record = self.loaded.get(record_id)
+        if record is None and record_id in self.offsets:
+            return self.read(self.offsets[record_id])
+        return record
+
+    def values(self):
+        # Walk without caching so a full listing does not pull everything into memory
+        for record_id, offset in self.offsets.items():
+            record = self.loaded.get(record_id)
+            yield record if record is not None else self.read(offset)
+
+    def rows(self, *names):
+        # (id, *fields) for every record, for building indexes: the fields
+        # are read straight from the snapshot where it can, so no records
+        # are built, and loaded ones are used as they are now
+        get = attrgetter("id", *names)
+        if self.scan is None:
+            yield from map(get, self.values())
+            return
+        loaded = self.loaded
+        for row in self.scan(self.offsets, names):
+            record = loaded.get(row[0])
+            yield row if record is None else get(record)
+        # Records added since the snapshot are in memory only
+        for record_id, record in loaded.items():
+            if self.offsets[record_id] is None:
+                yield get(record)
+
+    def page(self, offset, limit):
+        # Ids before the page are only stepped over, just the page is parsed
+        page = []
+        for record_id in islice(self.offsets, offset, offset + limit):
+            record = self.loaded.get(record_id)
+            page.append(record if record is not None else self.read(self.offsets[record_id]))
+        return page
+
+
+class JsonLinesSnapshot:
+    """One compact JSON record per line, under "books" and "members" section lines.
+
+    Loading only scans the file for record ids and their byte offsets;
+    records are parsed when they are first needed.
+    """
+
+    def __init__(self):
+        self.file = None
+        self.records = []
+
+    def read(self, offset):
+        # pread leaves the shared file position alone, so threads can read at
+        # once; where there is no pread (Windows) each read opens the file
+        if not hasattr(os, "pread"):
+            with open(self.file.name, "rb") as f:
+                f.seek(offset)
+                return json.loads(f.readline())
+        line = b""
+        while True:
+            chunk = os.pread(self.file.fileno(), READ_SIZE, offset + len(line))
+            end = chunk.find(b"\n")
+            if end >= 0:
+                return json.loads(line + chunk[:end])
+            if not chunk:
+                return json.loads(line)
+            line += chunk
+
+    def blocks(self, offset):
+        # Whole lines from offset on, a large block at a time
+        if not hasattr(os, "pread"):
+            with open(self.file.name, "rb") as f:
+                f.seek(offset)
+                while True:
+                    lines = f.readlines(SCAN_SIZE)
+                    if not lines:
+                        return
+                    yield lines
+        rest = b""
+        while True:
+            chunk = os.pread(self.file.fileno(), SCAN_SIZE, offset)
+            if not chunk:
+                if rest:
+                    yield [rest]
+                return
+            offset += len(chunk)
+            lines = (rest + chunk).split(b"\n")
+            rest = lines.pop()
+            yield lines
+
+    def scan(self, offsets, names):
+        # A section's records sit on consecutive lines from its first offset
+        # up to the next section line; each block is parsed in one call
+        start = next((offset for offset in offsets.values() if offset is not None), None)
+        if start is None:
+            return
+        for lines in self.blocks(start):
+            for data in json.loads(b"[" + b",".join(lines) + b"]"):
+                if "id" not in data:
+                    return
+                yield (data["id"], *[data[name] for name in names])
+
+    def load(self, path):
+        self.close()
+        self.file = open(path, "rb")
+        header = json.loads(self.file.readline())
+
+        # Only the ids are sliced out of each line, nothing is parsed here
+        sections = [{}, {}]
+        offsets = sections[0]
+        offset = self.file.tell()
+        for line in self.file:
+            if line.startswith(RECORD_START):
+                offsets[line[ID_AT:line.index(b'"', ID_AT)].decode()] = offset
+            elif line == SECTION_LINE % b"members":
+                offsets = sections[1]
+            offset += len(line)
+
+        self.records = [
+            LazyRecords(lambda offset: Book.from_dict(self.read(offset)), sections[0], self.scan),
+            LazyRecords(lambda offset: Member.from_dict(self.read(offset)), sections[1], self.scan),
+        ]
+        return self.records[0], self.records[1], header.get("journal_seq", 0)
+
+    def write(self, path, books, members, seq):
+        def write_lines(f):
+            new_offsets = []
+            offset = f.write(json.dumps({"journal_seq": seq}).encode() + b"\n")
+            for section, records in ((b"books", books), (b"members", members)):
+                offset += f.write(SECTION_LINE % section)
+                offsets = {}
+                for record in records:
+                    offsets[record.id] = offset
+                    line = json.dumps(record.to_dict(), separators=(",", ":"), default=str)
+                    offset += f.write(line.encode() + b"\n")
+                new_offsets.append(offsets)
+            return new_offsets
+
+        tmp, new_offsets = write_temp(path, write_lines)
+
+        # Windows cannot replace a file that is still open
+        self.close()
+        os.replace(tmp, path)
+        self.file = open(path, "rb")
+
+        # Records loaded from the old file now live at new offsets
+        for records, offsets in zip(self.records, new_offsets):
+            records.offsets = offsets
+            records.loaded = {}
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+MAGIC = b"LSNAP1\n"
+NO_TIME = -2 ** 63          # a due_on of None
+ODD_TIME = NO_TIME + 1      # a timestamp kept as text, stored in the header
+
+# (column, kind) per table. "text" is one string per row, "table" an index
+# into a list of distinct strings, "int" a 64-bit integer, "time" a
+# timestamp, "id" text plus a sorted copy for lookups. members.loans is
+# where each member's loans end in the loans table.
+COLUMNS = {
+    "books": [
+        ("id", "id"), ("title", "table"), ("author", "table"),
+        ("available_copies", "int"), ("total_copies", "int"), ("added_on", "time"),
+    ],
+    "members": [("id", "id"), ("name", "text"), ("email", "text"), ("loans", "int")],
+    "loans": [("book_id", "table"), ("title", "table"), ("borrowed_on", "time"), ("due_on", "time")],
+}
+COLUMN_KINDS = {f"{table}.{column}": kind for table, columns in COLUMNS.items() for column, kind in columns}
+
+
+def pack_strings(values):
+    # NUL-separated UTF-8, or a JSON list if a value itself contains a NUL
+    text = "\0".join(values)
+    if text.count("\0") == max(len(values) - 1, 0):
+        return "strings", len(values), text.encode()
+    return "json", len(values), json.dumps(values).encode()
+
+
+def unpack_strings(encoding, data, count):
+    if encoding == "json":
+        return json.loads(bytes(data))
+    return str(data, "utf-8").split("\0") if count else []
+
+
+class RowIndex:
+    """id -> row number for a snapshot's id column.
+
+    Looks ids up by binary search in the sorted copy stored with the
+    snapshot, which is much faster to load than hashing every id into a
+    dict. Ids added since the snapshot are kept in a dict.
+    """
+
+    def __init__(self, ids, sorted_ids, sorted_rows):
+        self.ids = ids
+        self.sorted_ids = sorted_ids
+        self.sorted_rows = sorted_rows
+        self.added = {}
+
+    def row(self, record_id):
+        i = bisect_left(self.sorted_ids, record_id)
+        if i < len(self.sorted_ids) and self.sorted_ids[i] == record_id:
+            return self.sorted_rows[i]
+        return None
+
+    def __len__(self):
+        return len(self.ids) + len(self.added)
+
+    def __contains__(self, record_id):
+        return record_id in self.added or self.row(record_id) is not None
+
+    def __getitem__(self, record_id):
+        if record_id in self.added:
+            return self.added[record_id]
+        row = self.row(record_id)
+        if row is None:
+            raise KeyError(record_id)
+        return row
+
+    def __iter__(self):
+        return chain(self.ids, self.added)
+
+    def setdefault(self, record_id, default=None):
+        if record_id not in self:
+            self.added[record_id] = default
+        return self[record_id]
+
+    def items(self):
+        return chain(zip(self.ids, range(len(self.ids))), self.added.items())
+
+
+class ColumnSnapshot:
+    """Binary snapshot with one array per column and shared string tables.
+
+    The file is a JSON header line followed by the raw column data, read in
+    one go. Loading only decodes the columns; Book and Member records are
+    built when first looked up.
+    """
+
+    def __init__(self):
+        self.columns = {}
+        self.odd = {}
+        self.records = []
+
+    def time(self, name, row):
+        value = self.columns[name][row]
+        if value == NO_TIME:
+            return None
+        if value == ODD_TIME:
+            return self.odd[name][row]
+        return value
+
+    def string(self, name, row):
+        return self.columns[name][self.columns[name + ".index"][row]]
+
+    def book(self, row):
+        c = self.columns
+        return Book(
+            c["books.id"][row],
+            self.string("books.title", row),
+            self.string("books.author", row),
+            c["books.available_copies"][row],
+            c["books.total_copies"][row],
+            self.time("books.added_on", row),
+        )
+
+    def member(self, row):
+        c = self.columns
+        loans = c["members.loans"]
+        borrowed = [
+            Loan(
+                self.string("loans.book_id", i),
+                self.string("loans.title", i),
+                self.time("loans.borrowed_on", i),
+                self.time("loans.due_on", i),
+            )
+            for i in range(loans[row - 1] if row else 0, loans[row])
+        ]
+        return Member(c["members.id"][row], c["members.name"][row], c["members.email"][row], borrowed)
+
+    def column(self, name):
+        # A text, id or int column's values in row order
+        kind = COLUMN_KINDS[name]
+        if kind == "table":
+            return map(self.columns[name].__getitem__, self.columns[name + ".index"])
+        return self.columns[name]
+
+    def scan(self, table, names):
+        # Rows added since the snapshot are not in the columns, and zip stops at the last stored one
+        return zip(self.columns[table + ".id"], *[self.column(f"{table}.{name}") for name in names])
+
+    def load(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        if not data.startswith(MAGIC):
+            raise ValueError(f"{path} is not a library snapshot")
+        end = data.index(b"\n", len(MAGIC))
+        header = json.loads(data[len(MAGIC):end])
+        self.odd = {name: {int(row): value for row, value in odd.items()} for name, odd in header["odd"].items()}
+
+        view = memoryview(data)
+        position = end + 1
+        self.columns = {}
+        for name, encoding, count, size in header["sections"]:
+            chunk = view[position:position + size]
+            position += size
+            if encoding in ("strings", "json"):
+                self.columns[name] = unpack_strings(encoding, chunk, count)
+            else:
+                column = self.columns[name] = array(encoding)
+                column.frombytes(chunk)
+                if header["byteorder"] != sys.byteorder:
+                    column.byteswap()
+
+        self.records = [
+            LazyRecords(self.book, self.row_numbers("books"), lambda offsets, names: self.scan("books", names)),
+            LazyRecords(self.member, self.row_numbers("members"), lambda offsets, names: self.scan("members", names)),
+        ]
+        return self.records[0], self.records[1], header["journal_seq"]
+
+    def row_numbers(self, table):
+        name = table + ".id"
+        return RowIndex(self.columns[name], self.columns[name + ".sorted"], self.columns[name + ".rows"])
+
+    def write(self, path, books, members, seq):
+        rows = {"books": [], "members": [], "loans": []}
+        loan_end = []
+        for book in books:
+            rows["books"].append(book)
+        for member in members:
+            rows["members"].append(member)
+            rows["loans"].extend(member.borrowed)
+            loan_end.append(len(rows["loans"]))
+
+        columns, odd, sections, chunks = {}, {}, [], []
+
+        def add(name, encoding, count, chunk):
+            sections.append([name, encoding, count, len(chunk)])
+            chunks.append(chunk)
+
+        for table, table_columns in COLUMNS.items():
+            for column, kind in table_columns:
+                name = f"{table}.{column}"
+                if name == "members.loans":
+                    values = loan_end
+                else:
+                    values = [getattr(record, column) for record in rows[table]]
+
+                if kind in ("text", "id"):
+                    columns[name] = values
+                    add(name, *pack_strings(values))
+                    if kind == "id":
+                        rows_by_id = array("I", sorted(range(len(values)), key=values.__getitem__))
+                        columns[name + ".sorted"] = [values[row] for row in rows_by_id]
+                        columns[name + ".rows"] = rows_by_id
+                        add(name + ".sorted", *pack_strings(columns[name + ".sorted"]))
+                        add(name + ".rows", "I", len(rows_by_id), rows_by_id.tobytes())
+                elif kind == "table":
+                    distinct = {}
+                    index = array("I", [distinct.setdefault(value, len(distinct)) for value in values])
+                    columns[name] = list(distinct)
+                    columns[name + ".index"] = index
+                    add(name, *pack_strings(columns[name]))
+                    add(name + ".index", "I", len(index), index.tobytes())
+                else:
+                    column = columns[name] = array("q")
+                    for row, value in enumerate(values):
+                        if kind == "time" and value is None:
+                            value = NO_TIME
+                        elif kind == "time" and (type(value) is not int or not ODD_TIME < value < 2 ** 63):
+                            odd.setdefault(name, {})[row] = value
+                            value = ODD_TIME
+                        column.append(value)
+                    add(name, "q", len(column), column.tobytes())
+
+        header = {"journal_seq": seq, "byteorder": sys.byteorder, "sections": sections, "odd": odd}
+
+        def write_columns(f):
+            f.write(MAGIC)
+            f.write(json.dumps(header, default=str).encode() + b"\n")
+            for chunk in chunks:
+                f.write(chunk)
+
+        tmp, _ = write_temp(path, write_columns)
+        os.replace(tmp, path)
+
+        # Records loaded from the old file now live at new row numbers
+        self.columns = columns
+        self.odd = odd
+        for records, table in zip(self.records, ("books", "members")):
+            records.offsets = self.row_numbers(table)
+            records.loaded = {}
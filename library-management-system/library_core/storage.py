@@ -0,0 +1,967 @@
+import heapq
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from .facets import FacetIndex
+from .ids import allocator
+from .journal import Journal
+from .loans import LoanIndex
+from .records import Book, Loan, Member, format_timestamp
+from .search_index import SearchIndex, tokenize
+
+
+def open_storage(database):
+    # *.db / *.sqlite files use SQLite, anything else a JSON snapshot + journal
+    if Path(database).suffix in (".db", ".sqlite", ".sqlite3"):
+        return SqliteStorage(database)
+    return JsonStorage(database)
+
+
+class LazyStorage:
+    """Stands in for a backend and only opens it the first time it is used,
+    so importing a front end does not load the library."""
+
+    def __init__(self, database, opener=open_storage):
+        self.database = database
+        self.opener = opener
+        self.backend = None
+
+    def __getattr__(self, name):
+        if self.backend is None:
+            self.backend = self.opener(self.database)
+        return getattr(self.backend, name)
+
+
+# Newest books kept by LibraryStats, enough for the dashboard
+RECENT_KEEP = 20
+
+
+class LibraryStats:
+    """Total copies and the most recently added books, updated as books are
+    added so the dashboard does not have to walk the whole catalogue."""
+
+    def __init__(self, books):
+        self.copies = 0
+        self.recent = []   # min-heap of (added_on key, book id), newest RECENT_KEEP
+        for book in books:
+            self.add_book(book)
+
+    def add_book(self, book):
+        self.copies += book.total_copies
+        # Timestamps that could not be parsed stay strings and sort oldest
+        item = ((isinstance(book.added_on, int), book.added_on), book.id)
+        if len(self.recent) < RECENT_KEEP:
+            heapq.heappush(self.recent, item)
+        elif item > self.recent[0]:
+            heapq.heapreplace(self.recent, item)
+
+    def recent_ids(self, limit):
+        return [book_id for key, book_id in heapq.nlargest(limit, self.recent)]
+
+
+class Storage:
+    """Interface the Library talks to, implemented by each backend.
+
+    Books and members are exchanged as Book and Member records; a member's
+    ``borrowed`` list is ordered oldest loan first. ``borrow`` and
+    ``return_book`` re-check the request against the current data and
+    return False instead of changing anything if it no longer holds. The
+    ``add_*`` methods give a record a fresh id if another process has used
+    its id in the meantime.
+    """
+
+    def refresh(self):
+        # Pick up changes other processes made since the last call
+        pass
+
+    def get_book(self, book_id):
+        raise NotImplementedError
+
+    def get_member(self, member_id):
+        raise NotImplementedError
+
+    def iter_books(self):
+        raise NotImplementedError
+
+    def iter_members(self):
+        raise NotImplementedError
+
+    def iter_borrowers(self):
+        raise NotImplementedError
+
+    def page_books(self, offset, limit):
+        raise NotImplementedError
+
+    def page_members(self, offset, limit):
+        raise NotImplementedError
+
+    def count_books(self):
+        raise NotImplementedError
+
+    def count_members(self):
+        raise NotImplementedError
+
+    def total_copies(self):
+        raise NotImplementedError
+
+    def recent_books(self, limit):
+        raise NotImplementedError
+
+    def search_books(self, query, limit=50):
+        raise NotImplementedError
+
+    def search_members(self, query, limit=50, borrowers_only=False):
+        raise NotImplementedError
+
+    def author_facets(self, prefix="", limit=50):
+        # (author, books, books in stock) for authors starting with prefix, most books first
+        raise NotImplementedError
+
+    def facet_books(self, author=None, available_only=False, offset=0, limit=50):
+        raise NotImplementedError
+
+    def count_facet(self, author=None, available_only=False):
+        raise NotImplementedError
+
+    def loans_for_book(self, book_id):
+        # (member id, Loan) for every copy of the book currently out
+        raise NotImplementedError
+
+    def overdue_loans(self, now, limit=None):
+        # (member id, Loan) for loans due before now, longest overdue first
+        raise NotImplementedError
+
+    def add_book(self, book):
+        raise NotImplementedError
+
+    def add_books(self, books):
+        raise NotImplementedError
+
+    def add_member(self, member):
+        raise NotImplementedError
+
+    def borrow(self, member_id, loan):
+        raise NotImplementedError
+
+    def return_book(self, member_id, loan):
+        # loan is one of the member's borrowed entries, matched by book id and
+        # borrow time rather than position, since earlier loans may be gone
+        raise NotImplementedError
+
+    def borrow_many(self, loans):
+        # [(member id, Loan), ...] all at once, or nothing if any of them fails
+        raise NotImplementedError
+
+    def return_many(self, returns):
+        # [(member id, Loan), ...] all at once, or nothing if any was already returned
+        raise NotImplementedError
+
+    def replace_records(self, books, members):
+        raise NotImplementedError
+
+    def save(self):
+        pass
+
+
+# Records read per hold of the thread lock by JsonStorage.iter_records
+ITER_CHUNK = 500
+
+
+class JsonStorage(Storage):
+    def __init__(self, database):
+        self.journal = Journal(database)
+        # Also guards the in-memory data against Streamlit's other threads
+        self.lock = self.journal.lock
+        with self.lock:
+            self.load()
+
+    def load(self):
+        # id -> record mappings, kept in sync by apply(); with a .jsonl
+        # snapshot they hold byte offsets and parse records on demand
+        self.books, self.members = self.journal.load_snapshot()
+
+        # Built on the first search rather than at startup
+        self._search_index = None
+        self._member_index = None
+        self._stats = None
+        self._loan_index = None
+        self._facets = None
+
+        # Replay mutations logged since the last snapshot
+        self.journal.replay(self.apply)
+
+    def sync(self):
+        # With the lock held: apply what other processes logged, or start
+        # over from their snapshot if one of them compacted
+        if self.journal.snapshot_replaced():
+            self.load()
+        else:
+            self.journal.replay(self.apply)
+
+    def refresh(self):
+        if self.journal.changed():
+            with self.lock:
+                self.sync()
+
+    @contextmanager
+    def mutation(self):
+        with self.lock:
+            self.sync()
+            yield
+
+    # The search and facet indexes read only the fields they need from the
+    # snapshot, without building a record per book or member
+
+    @property
+    def search_index(self):
+        if self._search_index is None:
+            self._search_index = SearchIndex(self.books.rows("title", "author"))
+        return self._search_index
+
+    @property
+    def stats(self):
+        if self._stats is None:
+            self._stats = LibraryStats(self.books.values())
+        return self._stats
+
+    @property
+    def loan_index(self):
+        if self._loan_index is None:
+            self._loan_index = LoanIndex()
+            for member in self.iter_records("members", keep=lambda member: member.borrowed):
+                for loan in member.borrowed:
+                    self._loan_index.add(member.id, loan)
+        return self._loan_index
+
+    @property
+    def facets(self):
+        if self._facets is None:
+            self._facets = FacetIndex(self.books.rows("author", "available_copies"))
+        return self._facets
+
+    @property
+    def member_index(self):
+        if self._member_index is None:
+            self._member_index = SearchIndex(self.members.rows("name", "email"))
+        return self._member_index
+
+    def get_book(self, book_id):
+        with self.lock.thread_lock:
+            return self.books.get(book_id)
+
+    def get_member(self, member_id):
+        with self.lock.thread_lock:
+            return self.members.get(member_id)
+
+    def iter_books(self):
+        return self.iter_records("books")
+
+    def iter_members(self):
+        return self.iter_records("members")
+
+    def iter_borrowers(self):
+        # Straight from the loan index; a member may have returned
+        # everything by the time their chunk is read
+        with self.lock.thread_lock:
+            ids = list(self.loan_index.borrowers)
+        return self.iter_records("members", lambda member: member.borrowed, ids)
+
+    def iter_records(self, section, keep=None, ids=None):
+        # Only the ids are copied under the lock; the records are then read
+        # a chunk at a time, each chunk under the lock, so a full listing
+        # streams instead of holding the whole library in memory
+        if ids is None:
+            with self.lock.thread_lock:
+                ids = list(getattr(self, section))
+        for start in range(0, len(ids), ITER_CHUNK):
+            with self.lock.thread_lock:
+                # Looked up again per chunk: a reload replaces the mapping
+                records = getattr(self, section)
+                chunk = [records.peek(record_id) for record_id in ids[start:start + ITER_CHUNK]]
+            for record in chunk:
+                if record is not None and (keep is None or keep(record)):
+                    yield record
+
+    def page_books(self, offset, limit):
+        with self.lock.thread_lock:
+            return self.books.page(offset, limit)
+
+    def page_members(self, offset, limit):
+        with self.lock.thread_lock:
+            return self.members.page(offset, limit)
+
+    def count_books(self):
+        return len(self.books)
+
+    def count_members(self):
+        return len(self.members)
+
+    def total_copies(self):
+        with self.lock.thread_lock:
+            return self.stats.copies
+
+    def recent_books(self, limit):
+        with self.lock.thread_lock:
+            if limit > RECENT_KEEP:
+                return heapq.nlargest(limit, self.books.values(), key=lambda x: (isinstance(x.added_on, int), x.added_on))
+            return [self.books[book_id] for book_id in self.stats.recent_ids(limit)]
+
+    def search_books(self, query, limit=50):
+        with self.lock.thread_lock:
+            return [self.books[book_id] for book_id in self.search_index.search(query, limit)]
+
+    def search_members(self, query, limit=50, borrowers_only=False):
+        with self.lock.thread_lock:
+            keep = self.loan_index.borrowers.__contains__ if borrowers_only else None
+            return [self.members[member_id] for member_id in self.member_index.search(query, limit, keep)]
+
+    def author_facets(self, prefix="", limit=50):
+        with self.lock.thread_lock:
+            return self.facets.facets(prefix, limit)
+
+    def facet_books(self, author=None, available_only=False, offset=0, limit=50):
+        with self.lock.thread_lock:
+            if author is None and not available_only:
+                return self.books.page(offset, limit)
+            return [self.books[book_id] for book_id in self.facets.page(author, available_only, offset, limit)]
+
+    def count_facet(self, author=None, available_only=False):
+        if author is None and not available_only:
+            return len(self.books)
+        with self.lock.thread_lock:
+            return self.facets.count(author, available_only)
+
+    def loans_for_book(self, book_id):
+        with self.lock.thread_lock:
+            return self.loan_index.on_loan(book_id)
+
+    def overdue_loans(self, now, limit=None):
+        with self.lock.thread_lock:
+            return self.loan_index.overdue_loans(now, limit)
+
+    def add_book(self, book):
+        with self.mutation():
+            reassign_taken([book], "B", self.books.__contains__)
+            self.record({"op": "add_book", "book": book.to_dict()})
+
+    def add_books(self, books):
+        books = list(books)
+        with self.mutation():
+            reassign_taken(books, "B", self.books.__contains__)
+            self.record({"op": "add_books", "books": [book.to_dict() for book in books]})
+
+    def add_member(self, member):
+        with self.mutation():
+            reassign_taken([member], "M", self.members.__contains__)
+            self.record({"op": "add_member", "member": member.to_dict()})
+
+    def borrow(self, member_id, loan):
+        with self.mutation():
+            book = self.books.get(loan.book_id)
+            if member_id not in self.members or not book or book.available_copies <= 0:
+                return False
+            self.record({"op": "borrow", "member_id": member_id, "loan": loan.to_dict()})
+            return True
+
+    def return_book(self, member_id, loan):
+        with self.mutation():
+            member = self.members.get(member_id)
+            indexes = find_loans(member, [loan]) if member else None
+            if indexes is None:
+                return False
+            # Positions found under the lock stay valid when the log is replayed in order
+            self.record({"op": "return", "member_id": member_id, "index": indexes[0]})
+            return True
+
+    def borrow_many(self, loans):
+        with self.mutation():
+            wanted = {}
+            for member_id, loan in loans:
+                wanted[loan.book_id] = wanted.get(loan.book_id, 0) + 1
+                if member_id not in self.members:
+                    return False
+            for book_id, count in wanted.items():
+                book = self.books.get(book_id)
+                if not book or book.available_copies < count:
+                    return False
+            # One journal line for the whole cart
+            self.record({
+                "op": "borrow_many",
+                "loans": [{"member_id": member_id, "loan": loan.to_dict()} for member_id, loan in loans],
+            })
+            return True
+
+    def return_many(self, returns):
+        with self.mutation():
+            by_member = {}
+            for member_id, loan in returns:
+                by_member.setdefault(member_id, []).append(loan)
+            positions = []
+            for member_id, loans in by_member.items():
+                member = self.members.get(member_id)
+                indexes = find_loans(member, loans) if member else None
+                if indexes is None:
+                    return False
+                positions.extend([member_id, index] for index in indexes)
+            self.record({"op": "return_many", "returns": positions})
+            return True
+
+    def replace_records(self, books, members):
+        # Straight to a new snapshot, skipping the journal
+        with self.lock:
+            self.journal.compact(books, members)
+            self.load()
+
+    def save(self):
+        # Catch up first, or entries other processes logged would be lost
+        with self.mutation():
+            # Nothing logged since the last snapshot: rewriting it would only
+            # make every other process reload
+            if self.journal.pending:
+                self.journal.compact(self.books.values(), self.members.values())
+
+    def apply(self, entry):
+        op = entry["op"]
+        if op == "add_book":
+            self.insert_book(Book.from_dict(entry["book"]))
+        elif op == "add_books":
+            for data in entry["books"]:
+                self.insert_book(Book.from_dict(data))
+        elif op == "add_member":
+            member = Member.from_dict(entry["member"])
+            self.members[member.id] = member
+            if self._member_index is not None:
+                self._member_index.add(member.id, member.name, member.email)
+        elif op == "borrow":
+            loan = Loan.from_dict(entry["loan"])
+            self.members[entry["member_id"]].borrowed.append(loan)
+            book = self.books[loan.book_id]
+            book.available_copies -= 1
+            if self._facets is not None:
+                self._facets.update(book)
+            if self._loan_index is not None:
+                self._loan_index.add(entry["member_id"], loan)
+        elif op == "borrow_many":
+            for item in entry["loans"]:
+                self.apply(dict(item, op="borrow"))
+        elif op == "return_many":
+            # Highest index first, so the lower ones still point at the same loans
+            for member_id, index in sorted(entry["returns"], key=lambda item: -item[1]):
+                self.apply({"op": "return", "member_id": member_id, "index": index})
+        elif op == "return":
+            member = self.members[entry["member_id"]]
+            selected = member.borrowed.pop(entry["index"])
+            book = self.books.get(selected.book_id)
+            if book:
+                book.available_copies += 1
+                if self._facets is not None:
+                    self._facets.update(book)
+            if self._loan_index is not None:
+                self._loan_index.remove(member.id, selected)
+
+    def insert_book(self, book):
+        self.books[book.id] = book
+        if self._search_index is not None:
+            self._search_index.add(book.id, book.title, book.author)
+        if self._stats is not None:
+            self._stats.add_book(book)
+        if self._facets is not None:
+            self._facets.add(book)
+
+    def record(self, entry):
+        # Apply in memory, then append one line to the journal instead of rewriting the snapshot
+        self.apply(entry)
+        self.journal.append(entry)
+        if self.journal.wants_compaction():
+            self.journal.compact(self.books.values(), self.members.values())
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    available_copies INTEGER NOT NULL,
+    total_copies INTEGER NOT NULL,
+    added_on TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS books_added_on ON books (added_on);
+CREATE INDEX IF NOT EXISTS books_author ON books (author);
+-- Only the books with a copy on the shelf, for the Borrow page
+CREATE INDEX IF NOT EXISTS books_in_stock ON books (id) WHERE available_copies > 0;
+
+CREATE TABLE IF NOT EXISTS members (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS loans (
+    id INTEGER PRIMARY KEY,
+    member_id TEXT NOT NULL REFERENCES members (id),
+    book_id TEXT NOT NULL REFERENCES books (id),
+    title TEXT NOT NULL,
+    borrowed_on TEXT NOT NULL,
+    due_on TEXT
+);
+CREATE INDEX IF NOT EXISTS loans_member ON loans (member_id, id);
+CREATE INDEX IF NOT EXISTS loans_book ON loans (book_id);
+
+-- Running totals for the dashboard, since COUNT(*) and SUM() scan the table
+CREATE TABLE IF NOT EXISTS stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    books INTEGER NOT NULL,
+    members INTEGER NOT NULL,
+    copies INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS stats_book_insert AFTER INSERT ON books BEGIN
+    UPDATE stats SET books = books + 1, copies = copies + new.total_copies;
+END;
+CREATE TRIGGER IF NOT EXISTS stats_book_update AFTER UPDATE OF total_copies ON books BEGIN
+    UPDATE stats SET copies = copies - old.total_copies + new.total_copies;
+END;
+CREATE TRIGGER IF NOT EXISTS stats_book_delete AFTER DELETE ON books BEGIN
+    UPDATE stats SET books = books - 1, copies = copies - old.total_copies;
+END;
+CREATE TRIGGER IF NOT EXISTS stats_member_insert AFTER INSERT ON members BEGIN
+    UPDATE stats SET members = members + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS stats_member_delete AFTER DELETE ON members BEGIN
+    UPDATE stats SET members = members - 1;
+END;
+"""
+
+# Counted once, for databases that have no stats row yet
+SEED_STATS = """
+INSERT OR IGNORE INTO stats (id, books, members, copies) SELECT
+    1,
+    (SELECT COUNT(*) FROM books),
+    (SELECT COUNT(*) FROM members),
+    (SELECT COALESCE(SUM(total_copies), 0) FROM books);
+"""
+
+# Searchable tables and their two indexed columns
+SEARCH_COLUMNS = {"books": ("title", "author"), "members": ("name", "email")}
+
+# Full-text index over a table, kept current by the insert trigger
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE {table}_fts USING fts5 (
+    {first}, {second}, content = '{table}', content_rowid = 'rowid', prefix = '1 2 3'
+);
+CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN
+    INSERT INTO {table}_fts (rowid, {first}, {second}) VALUES (new.rowid, new.{first}, new.{second});
+END;
+INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild');
+"""
+
+# Same ranking as SearchIndex: first column matches weigh twice as much as second column matches
+SEARCH_QUERY = """
+SELECT {table}.* FROM {table}_fts JOIN {table} ON {table}.rowid = {table}_fts.rowid
+WHERE {table}_fts MATCH ? {where} ORDER BY bm25({table}_fts, 2.0, 1.0) LIMIT ?
+"""
+
+# Databases created before loans had due dates get the column and the
+# standard loan period filled in (see records.LOAN_DAYS)
+ADD_DUE_ON = """
+ALTER TABLE loans ADD COLUMN due_on TEXT;
+UPDATE loans SET due_on = datetime(borrowed_on, '+14 days');
+"""
+DUE_INDEX = "CREATE INDEX IF NOT EXISTS loans_due ON loans (due_on)"
+
+# Per-author counts and the number of books in stock, kept by triggers so
+# facet counts never scan the books table
+FACET_SCHEMA = """
+ALTER TABLE stats ADD COLUMN available INTEGER NOT NULL DEFAULT 0;
+UPDATE stats SET available = (SELECT COUNT(*) FROM books WHERE available_copies > 0);
+CREATE TABLE author_facets (
+    author TEXT PRIMARY KEY,
+    books INTEGER NOT NULL,
+    available INTEGER NOT NULL
+);
+CREATE INDEX author_facets_books ON author_facets (books);
+INSERT INTO author_facets (author, books, available)
+    SELECT author, COUNT(*), SUM(available_copies > 0) FROM books GROUP BY author;
+CREATE TRIGGER facets_book_insert AFTER INSERT ON books BEGIN
+    INSERT INTO author_facets (author, books, available) VALUES (new.author, 1, new.available_copies > 0)
+        ON CONFLICT (author) DO UPDATE SET books = books + 1, available = available + excluded.available;
+    UPDATE stats SET available = available + (new.available_copies > 0);
+END;
+CREATE TRIGGER facets_book_update AFTER UPDATE OF available_copies ON books
+WHEN (old.available_copies > 0) != (new.available_copies > 0) BEGIN
+    UPDATE author_facets SET available = available + (new.available_copies > 0) - (old.available_copies > 0)
+        WHERE author = new.author;
+    UPDATE stats SET available = available + (new.available_copies > 0) - (old.available_copies > 0);
+END;
+CREATE TRIGGER facets_book_delete AFTER DELETE ON books BEGIN
+    UPDATE author_facets SET books = books - 1, available = available - (old.available_copies > 0)
+        WHERE author = old.author;
+    UPDATE stats SET available = available - (old.available_copies > 0);
+END;
+"""
+
+# Stored in PRAGMA user_version once the schema above is in place; bump it
+# when adding to the schema so existing databases are brought up to date
+SCHEMA_VERSION = 1
+
+LOAN_COLUMNS = "book_id, title, borrowed_on, due_on"
+
+INSERT_BOOK = (
+    "INSERT INTO books (id, title, author, available_copies, total_copies, added_on) "
+    "VALUES (:id, :title, :author, :available_copies, :total_copies, :added_on)"
+)
+INSERT_MEMBER = "INSERT INTO members (id, name, email) VALUES (:id, :name, :email)"
+INSERT_LOAN = (
+    f"INSERT INTO loans (member_id, {LOAN_COLUMNS}) "
+    "VALUES (:member_id, :book_id, :title, :borrowed_on, :due_on)"
+)
+
+
+class SqliteStorage(Storage):
+    """Rows live in indexed SQLite tables and are only read when asked for.
+
+    Each thread gets its own connection; SQLite's own locking keeps
+    threads and processes from stepping on each other.
+    """
+
+    def __init__(self, database):
+        Path(database).parent.mkdir(parents=True, exist_ok=True)
+        self.database = database
+        self.local = threading.local()
+        conn = self.conn
+        conn.execute("PRAGMA journal_mode = WAL")
+        if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self.create_schema()
+
+    def create_schema(self):
+        # Checked and created in one write transaction, so processes opening
+        # a new database at once cannot both find a table missing
+        conn = self.conn
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            run_script(conn, SCHEMA)
+            if not conn.execute("SELECT 1 FROM stats").fetchone():
+                run_script(conn, SEED_STATS)
+            columns = [row["name"] for row in conn.execute("PRAGMA table_info(loans)")]
+            if "due_on" not in columns:
+                run_script(conn, ADD_DUE_ON)
+            conn.execute(DUE_INDEX)
+            for table, (first, second) in SEARCH_COLUMNS.items():
+                if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table + "_fts",)).fetchone():
+                    run_script(conn, SEARCH_SCHEMA.format(table=table, first=first, second=second))
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'author_facets'").fetchone():
+                run_script(conn, FACET_SCHEMA)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @property
+    def conn(self):
+        # Streamlit serves sessions from several threads
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.database, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def get_book(self, book_id):
+        row = self.conn.execute("SELECT * FROM books WHERE id = ?", (book_id,)).fetchone()
+        return Book.from_dict(row) if row else None
+
+    def get_member(self, member_id):
+        row = self.conn.execute("SELECT * FROM members WHERE id = ?", (member_id,)).fetchone()
+        if not row:
+            return None
+        loans = self.conn.execute(f"SELECT {LOAN_COLUMNS} FROM loans WHERE member_id = ? ORDER BY id", (member_id,))
+        return Member(row["id"], row["name"], row["email"], [Loan.from_dict(loan) for loan in loans])
+
+    def iter_books(self):
+        for row in self.conn.execute("SELECT * FROM books ORDER BY rowid"):
+            yield Book.from_dict(row)
+
+    def iter_members(self):
+        return self._with_loans("SELECT * FROM members ORDER BY id")
+
+    def iter_borrowers(self):
+        return self._with_loans(
+            "SELECT * FROM members WHERE id IN (SELECT member_id FROM loans) ORDER BY id"
+        )
+
+    def _with_loans(self, query):
+        # Merge members with the loans table, both walked in member id order
+        loans = self.conn.execute(f"SELECT member_id, {LOAN_COLUMNS} FROM loans ORDER BY member_id, id")
+        loan = loans.fetchone()
+        for row in self.conn.execute(query):
+            member = Member(row["id"], row["name"], row["email"])
+            while loan and loan["member_id"] < member.id:
+                loan = loans.fetchone()
+            while loan and loan["member_id"] == member.id:
+                member.borrowed.append(Loan.from_dict(loan))
+                loan = loans.fetchone()
+            yield member
+
+    def _members(self, rows):
+        # Loans for a handful of members in one query
+        members = {row["id"]: Member(row["id"], row["name"], row["email"]) for row in rows}
+        marks = ", ".join("?" * len(members))
+        loans = self.conn.execute(
+            f"SELECT member_id, {LOAN_COLUMNS} FROM loans WHERE member_id IN ({marks}) ORDER BY id",
+            list(members),
+        )
+        for loan in loans:
+            members[loan["member_id"]].borrowed.append(Loan.from_dict(loan))
+        return list(members.values())
+
+    def page_books(self, offset, limit):
+        rows = self.conn.execute("SELECT * FROM books ORDER BY rowid LIMIT ? OFFSET ?", (limit, offset))
+        return [Book.from_dict(row) for row in rows]
+
+    def page_members(self, offset, limit):
+        return self._members(self.conn.execute("SELECT * FROM members ORDER BY rowid LIMIT ? OFFSET ?", (limit, offset)))
+
+    def count_books(self):
+        return self.conn.execute("SELECT books FROM stats").fetchone()[0]
+
+    def count_members(self):
+        return self.conn.execute("SELECT members FROM stats").fetchone()[0]
+
+    def total_copies(self):
+        return self.conn.execute("SELECT copies FROM stats").fetchone()[0]
+
+    def recent_books(self, limit):
+        rows = self.conn.execute("SELECT * FROM books ORDER BY added_on DESC LIMIT ?", (limit,))
+        return [Book.from_dict(row) for row in rows]
+
+    def _search(self, table, query, limit, where=""):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        match = " ".join(f'"{term}"*' for term in terms)
+        return self.conn.execute(SEARCH_QUERY.format(table=table, where=where), (match, limit)).fetchall()
+
+    def search_books(self, query, limit=50):
+        return [Book.from_dict(row) for row in self._search("books", query, limit)]
+
+    def search_members(self, query, limit=50, borrowers_only=False):
+        # Borrowers are filtered in the query, before the limit, through loans_member
+        where = "AND members.id IN (SELECT member_id FROM loans)" if borrowers_only else ""
+        return self._members(self._search("members", query, limit, where))
+
+    def author_facets(self, prefix="", limit=50):
+        # LIKE is case-insensitive like FacetIndex; % and _ in the prefix are taken literally
+        pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        rows = self.conn.execute(
+            "SELECT author, books, available FROM author_facets WHERE books > 0 AND author LIKE ? ESCAPE '\\' "
+            "ORDER BY books DESC LIMIT ?",
+            (pattern, limit),
+        )
+        return [tuple(row) for row in rows]
+
+    def facet_books(self, author=None, available_only=False, offset=0, limit=50):
+        # Served by books_author or the books_in_stock partial index
+        if author is not None:
+            query = "SELECT * FROM books WHERE author = ?" + (" AND available_copies > 0" if available_only else "")
+            rows = self.conn.execute(query + " ORDER BY rowid LIMIT ? OFFSET ?", (author, limit, offset))
+        elif available_only:
+            rows = self.conn.execute(
+                "SELECT * FROM books WHERE available_copies > 0 ORDER BY id LIMIT ? OFFSET ?", (limit, offset)
+            )
+        else:
+            return self.page_books(offset, limit)
+        return [Book.from_dict(row) for row in rows]
+
+    def count_facet(self, author=None, available_only=False):
+        column = "available" if available_only else "books"
+        if author is None:
+            return self.conn.execute(f"SELECT {column} FROM stats").fetchone()[0]
+        row = self.conn.execute(f"SELECT {column} FROM author_facets WHERE author = ?", (author,)).fetchone()
+        return row[0] if row else 0
+
+    def loans_for_book(self, book_id):
+        rows = self.conn.execute(f"SELECT member_id, {LOAN_COLUMNS} FROM loans WHERE book_id = ? ORDER BY id", (book_id,))
+        return [(row["member_id"], Loan.from_dict(row)) for row in rows]
+
+    def overdue_loans(self, now, limit=None):
+        # Walks the due-date index from the oldest, stopping at now
+        rows = self.conn.execute(
+            f"SELECT member_id, {LOAN_COLUMNS} FROM loans WHERE due_on < ? ORDER BY due_on LIMIT ?",
+            (format_timestamp(now), -1 if limit is None else limit),
+        )
+        return [(row["member_id"], Loan.from_dict(row)) for row in rows]
+
+    def taken(self, table, records):
+        # Check for the records' ids a few hundred at a time; ids looked up
+        # afterwards (fresh ones from the allocator) are checked one by one
+        ids = [record.id for record in records]
+        found = set()
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            marks = ", ".join("?" * len(chunk))
+            found.update(row[0] for row in self.conn.execute(f"SELECT id FROM {table} WHERE id IN ({marks})", chunk))
+
+        checked = set(ids)
+
+        def is_taken(record_id):
+            if record_id in checked:
+                return record_id in found
+            return self.conn.execute(f"SELECT 1 FROM {table} WHERE id = ?", (record_id,)).fetchone() is not None
+
+        return is_taken
+
+    def add_book(self, book):
+        self.add_books([book])
+
+    def add_books(self, books):
+        books = list(books)
+        conn = self.conn
+        with conn:
+            # No other writer can take an id between the check and the insert
+            conn.execute("BEGIN IMMEDIATE")
+            reassign_taken(books, "B", self.taken("books", books))
+            conn.executemany(INSERT_BOOK, (book.to_dict() for book in books))
+
+    def add_member(self, member):
+        conn = self.conn
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            reassign_taken([member], "M", self.taken("members", [member]))
+            conn.execute(INSERT_MEMBER, member.to_dict())
+            conn.executemany(INSERT_LOAN, loan_rows(member))
+
+    def borrow(self, member_id, loan):
+        conn = self.conn
+        with conn:
+            # The copy is taken first; the write lock is then held until commit
+            taken = conn.execute(
+                "UPDATE books SET available_copies = available_copies - 1 WHERE id = ? AND available_copies > 0",
+                (loan.book_id,),
+            ).rowcount
+            if not taken or not conn.execute("SELECT 1 FROM members WHERE id = ?", (member_id,)).fetchone():
+                conn.rollback()
+                return False
+            conn.execute(INSERT_LOAN, dict(loan.to_dict(), member_id=member_id))
+        return True
+
+    def return_book(self, member_id, loan):
+        return self.return_many([(member_id, loan)])
+
+    def borrow_many(self, loans):
+        conn = self.conn
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for member_id, loan in loans:
+                taken = conn.execute(
+                    "UPDATE books SET available_copies = available_copies - 1 WHERE id = ? AND available_copies > 0",
+                    (loan.book_id,),
+                ).rowcount
+                if not taken or not conn.execute("SELECT 1 FROM members WHERE id = ?", (member_id,)).fetchone():
+                    conn.rollback()
+                    return False
+            conn.executemany(INSERT_LOAN, (dict(loan.to_dict(), member_id=member_id) for member_id, loan in loans))
+        return True
+
+    def return_many(self, returns):
+        conn = self.conn
+        with conn:
+            # Taking the write lock first keeps the loans found here until commit
+            conn.execute("BEGIN IMMEDIATE")
+            rows = []
+            loan_lists = {}
+            for member_id, loan in returns:
+                if member_id not in loan_lists:
+                    loan_lists[member_id] = conn.execute(
+                        "SELECT id, book_id, borrowed_on FROM loans WHERE member_id = ? ORDER BY id", (member_id,)
+                    ).fetchall()
+                borrowed_on = format_timestamp(loan.borrowed_on)
+                # Each loan is matched once, oldest first, like find_loans()
+                row = next((
+                    row for row in loan_lists[member_id]
+                    if row["book_id"] == loan.book_id and row["borrowed_on"] == borrowed_on and row not in rows
+                ), None)
+                if row is None:
+                    conn.rollback()
+                    return False
+                rows.append(row)
+            conn.executemany("DELETE FROM loans WHERE id = ?", ((row["id"],) for row in rows))
+            conn.executemany(
+                "UPDATE books SET available_copies = available_copies + 1 WHERE id = ?",
+                ((row["book_id"],) for row in rows),
+            )
+        return True
+
+    def replace_records(self, books, members):
+        loans = []
+
+        def member_rows():
+            for member in members:
+                loans.extend(loan_rows(member))
+                yield member.to_dict()
+
+        with self.conn:
+            self.conn.execute("DELETE FROM loans")
+            self.conn.execute("DELETE FROM members")
+            self.conn.execute("DELETE FROM books")
+            self.conn.execute("INSERT INTO books_fts (books_fts) VALUES ('delete-all')")
+            self.conn.execute("INSERT INTO members_fts (members_fts) VALUES ('delete-all')")
+            self.conn.executemany(INSERT_BOOK, (book.to_dict() for book in books))
+            self.conn.executemany(INSERT_MEMBER, member_rows())
+            self.conn.executemany(INSERT_LOAN, loans)
+
+
+def run_script(conn, script):
+    # executescript() would commit the open transaction first, so scripts
+    # are run a statement at a time instead
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ""
+
+
+def find_loans(member, loans):
+    # Where the given loans sit in member.borrowed now, each matched to a
+    # different entry; None if any of them has been returned since
+    indexes = []
+    for loan in loans:
+        for index, held in enumerate(member.borrowed):
+            if index not in indexes and held.book_id == loan.book_id and held.borrowed_on == loan.borrowed_on:
+                indexes.append(index)
+                break
+        else:
+            return None
+    return indexes
+
+
+def reassign_taken(records, prefix, taken):
+    # Ids are allocated before the write lock is held, so another process
+    # may have used one since; those records get a fresh id instead of
+    # overwriting (or clashing with) what is already stored
+    seen = set()
+    clashes = []
+    for record in records:
+        if record.id in seen or taken(record.id):
+            clashes.append(record)
+        else:
+            seen.add(record.id)
+    if clashes:
+        new_ids = allocator(prefix).allocate(len(clashes), lambda new_id: new_id in seen or taken(new_id))
+        for record, new_id in zip(clashes, new_ids):
+            record.id = new_id
+
+
+def loan_rows(member):
+    return [dict(loan.to_dict(), member_id=member.id) for loan in member.borrowed]
+
+
+def copy_storage(source, target):
+    target.replace_records(source.iter_books(), source.iter_members())
+
+
+if __name__ == "__main__":
+    # Convert between backends, e.g. python -m library_core.storage data.json data.jsonl
+    if len(sys.argv) != 3:
+        print("Usage: python -m library_core.storage <source> <target>")
+        sys.exit(1)
+    copy_storage(open_storage(sys.argv[1]), open_storage(sys.argv[2]))
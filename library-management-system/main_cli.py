@@ -1,37 +1,10 @@
-import random
-import string
-import json
-from pathlib import Path
-from datetime import datetime
-
-class Library:
-    database = "library-management/data.json"
-    data = {"books": [], "members": []}
-
-    # Ensure directory exists
-    Path(database).parent.mkdir(parents=True, exist_ok=True)
-
-    # Load existing data from json or create json
-    if Path(database).exists():
-        with open(database, "r") as f:
-            content = f.read().strip()
-            if content:
-                data = json.loads(content)
-    else:
-        with open(database, "w") as f:
-            json.dump(data, f, indent=4, default=str)
-    
-    @staticmethod
-    def generate_id(prefix="B"):
-        random_id = ""
-        for i in range(5):
-            random_id += random.choice(string.ascii_uppercase + string.digits)
-        return prefix + "-" + random_id
-
-    @classmethod
-    def save_data(cls):
-        with open(cls.database, "w") as f:
-            json.dump(cls.data, f, indent=4, default=str)
+from library_core import Library, format_timestamp, now
+
+
+class LibraryCLI:
+    # Prompts and tables only; the work is done by library_core.Library
+    def __init__(self, library=None):
+        self.library = library or Library()
     
     def add_book(self):
         title = input("Enter book title: ")
@@ -42,126 +15,157 @@ class Library:
             print("Invalid number of copies. Book not added.")
             return
         
-        book = {
-            "id": Library.generate_id(),
-            "title": title,
-            "author": author,
-            "available_copies": copies,
-            "total_copies": copies,
-            "added_on": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        Library.data["books"].append(book)
-        Library.save_data()
+        self.library.add_book(title, author, copies)
         print("✓ Book added successfully!")
     
     def list_books(self):
-        if not Library.data["books"]:
+        if not self.library.count_books():
             print("No books found in the library.")
             return
         
         print("\n" + "="*70)
         print(f"{'ID':<12} {'Title':<25} {'Author':<20} {'Copies'}")
         print("="*70)
-        for b in Library.data["books"]:
-            print(f"{b['id']:<12} {b['title'][:24]:<25} {b['author'][:19]:<20} {b['available_copies']}/{b['total_copies']}")
+        for b in self.library.get_all_books():
+            print(f"{b.id:<12} {b.title[:24]:<25} {b.author[:19]:<20} {b.available_copies}/{b.total_copies}")
+        print()
+
+    def browse_books(self):
+        facets = self.library.author_facets(input("Author starts with (blank for all): ").strip())
+        if not facets:
+            print("No matching authors.")
+            return
+
+        print("\n" + "="*70)
+        print(f"{'Author':<40} {'Books':<10} {'In stock'}")
+        print("="*70)
+        for author, count, in_stock in facets:
+            print(f"{author[:39]:<40} {count:<10} {in_stock}")
         print()
 
-    @staticmethod
-    def add_member():
+        author = input("Show books by author (blank for all): ").strip() or None
+        in_stock = input("In stock only? (y/n): ").strip().lower() == "y"
+        total = self.library.count_facet(author, in_stock)
+        if not total:
+            print("No matching books.")
+            return
+
+        print("\n" + "="*70)
+        print(f"{'ID':<12} {'Title':<25} {'Author':<20} {'Copies'}")
+        print("="*70)
+        # Read through the facet index a page at a time
+        for offset in range(0, total, 100):
+            for b in self.library.facet_books(author, in_stock, offset, 100):
+                print(f"{b.id:<12} {b.title[:24]:<25} {b.author[:19]:<20} {b.available_copies}/{b.total_copies}")
+        print(f"\n{total} matching book(s)")
+
+    def add_member(self):
         name = input("Enter the name: ")
         email = input("Please enter the email: ")
-        member = {
-            "id": Library.generate_id("M"),
-            "name": name,
-            "email": email,
-            "borrowed": []
-        }
-        Library.data["members"].append(member)
-        Library.save_data()
+        self.library.add_member(name, email)
         print("✓ Member added successfully!")
 
     def list_members(self):
-        if not Library.data["members"]:
+        if not self.library.count_members():
             print("No members found.")
             return
         
         print("\n" + "="*70)
         print(f"{'ID':<12} {'Name':<25} {'Email':<30}")
         print("="*70)
-        for b in Library.data["members"]:
-            print(f"{b['id']:<12} {b['name'][:24]:<25} {b['email'][:29]:<30}")
-            if b['borrowed']:
-                print(f"  Currently borrowed: {len(b['borrowed'])} book(s)")
-                for item in b['borrowed']:
-                    print(f"    - {item['title']} (borrowed on {item['borrowed_on']})")
+        for b in self.library.get_all_members():
+            print(f"{b.id:<12} {b.name[:24]:<25} {b.email[:29]:<30}")
+            if b.borrowed:
+                print(f"  Currently borrowed: {len(b.borrowed)} book(s)")
+                for item in b.borrowed:
+                    print(f"    - {item.title} (borrowed on {format_timestamp(item.borrowed_on)}, due {format_timestamp(item.due_on)})")
         print()
 
     def borrow_book(self):
         member_id = input("Enter your membership ID: ").strip()
-        members = [m for m in Library.data["members"] if m["id"] == member_id]
-        if not members:
+        member = self.library.get_member(member_id)
+        if not member:
             print("No such member exists.")
             return
-        member = members[0]
         
         book_id = input("Enter book ID: ").strip()
-        books = [b for b in Library.data["books"] if b["id"] == book_id]
-        if not books:
+        book = self.library.get_book(book_id)
+        if not book:
             print("No such book exists.")
             return
-        book = books[0]
-        
-        if book["available_copies"] <= 0:
-            print("Sorry, no copies available.")
-            return
         
-        borrow_entry = {
-            "book_id": book["id"],
-            "title": book["title"],
-            "borrowed_on": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        member["borrowed"].append(borrow_entry)
-        book['available_copies'] -= 1 
-        Library.save_data()
-        print(f"✓ Book '{book['title']}' borrowed successfully!")
+        success, message = self.library.borrow_book(member.id, book.id)
+        print(f"✓ {message}" if success else f"Sorry, {message[0].lower() + message[1:]}.")
 
     def return_book(self):
         member_id = input("Enter the member ID: ").strip()
-        members = [m for m in Library.data['members'] if m['id'] == member_id]
-        if not members:
+        member = self.library.get_member(member_id)
+        if not member:
             print("No such member ID exists.")
             return 
-        
-        member = members[0]
 
-        if not member['borrowed']:
+        if not member.borrowed:
             print("No borrowed books to return.")
             return 
         
         print("\nBorrowed books:")
-        for i, b in enumerate(member['borrowed'], start=1):
-            print(f"{i}. {b['title']} ({b['book_id']}) - Borrowed on {b['borrowed_on']}")
+        for i, b in enumerate(member.borrowed, start=1):
+            print(f"{i}. {b.title} ({b.book_id}) - Borrowed on {format_timestamp(b.borrowed_on)}, due {format_timestamp(b.due_on)}")
         
         try:
-            choice = int(input("Enter number to return: "))
-            if choice < 1 or choice > len(member['borrowed']):
+            # Several numbers at once return them together, e.g. 1,3,4
+            choices = sorted({int(c) for c in input("Enter number(s) to return: ").split(",")})
+            if choices[0] < 1 or choices[-1] > len(member.borrowed):
                 print("Invalid choice.")
                 return
-            selected = member['borrowed'].pop(choice - 1)
         except (ValueError, IndexError):
             print("Invalid input.")
             return
         
-        books = [bk for bk in Library.data['books'] if bk['id'] == selected['book_id']]
-        if books:
-            books[0]['available_copies'] += 1
-        
-        Library.save_data()
-        print(f"✓ Book '{selected['title']}' returned successfully!")
+        if len(choices) == 1:
+            success, message = self.library.return_book(member.id, member.borrowed[choices[0] - 1])
+        else:
+            success, message = self.library.return_many([(member.id, member.borrowed[c - 1]) for c in choices])
+        print(f"✓ {message}" if success else message)
+
+    def book_loans(self):
+        book_id = input("Enter book ID: ").strip()
+        book = self.library.get_book(book_id)
+        if not book:
+            print("No such book exists.")
+            return
+
+        loans = self.library.loans_for_book(book.id)
+        print(f"\n{book.title}: {book.available_copies} of {book.total_copies} on the shelf")
+        if not loans:
+            return
+
+        print("="*70)
+        print(f"{'Member ID':<12} {'Name':<25} {'Borrowed':<20} {'Due'}")
+        print("="*70)
+        for member_id, loan in loans:
+            member = self.library.get_member(member_id)
+            name = member.name if member else ""
+            print(f"{member_id:<12} {name[:24]:<25} {format_timestamp(loan.borrowed_on):<20} {format_timestamp(loan.due_on)}")
+
+    def list_overdue(self):
+        today = now()
+        overdue = self.library.overdue_loans(today)
+        if not overdue:
+            print("No overdue loans.")
+            return
+
+        print("\n" + "="*70)
+        print(f"{'Member ID':<12} {'Title':<25} {'Due':<20} {'Days late'}")
+        print("="*70)
+        for member_id, loan in overdue:
+            days_late = (today - loan.due_on) // 86400
+            print(f"{member_id:<12} {loan.title[:24]:<25} {format_timestamp(loan.due_on):<20} {days_late}")
+        print(f"\n{len(overdue)} overdue loan(s)")
 
 
 def main():
-    lib = Library()
+    lib = LibraryCLI()
     
     while True:
         print("\n" + "="*30)
@@ -173,6 +177,9 @@ def main():
         print("4. Return book")
         print("5. Add member")
         print("6. List members")
+        print("7. Overdue loans")
+        print("8. Browse by author / in stock")
+        print("9. Who has a book")
         print("0. Exit")
         print("="*30)
 
@@ -182,6 +189,9 @@ def main():
             print("Please enter a valid number.")
             continue
 
+        # See what other sessions changed while we waited for input
+        lib.library.refresh()
+
         if choice == 1:
             lib.add_book()
         elif choice == 2:
@@ -194,11 +204,19 @@ def main():
             lib.add_member()
         elif choice == 6:
             lib.list_members()    
+        elif choice == 7:
+            lib.list_overdue()
+        elif choice == 8:
+            lib.browse_books()
+        elif choice == 9:
+            lib.book_loans()
         elif choice == 0:
+            # Fold the journal back into the snapshot before leaving
+            lib.library.save_data()
             print("Thank you for using Library Management System!")
             break
         else:
-            print("Invalid choice. Please select 0-6.")
+            print("Invalid choice. Please select 0-9.")
 
 
 if __name__ == "__main__":
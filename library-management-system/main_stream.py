@@ -1,117 +1,64 @@
-import random
-import string
-import json
-from pathlib import Path
-from datetime import datetime
+from itertools import islice
+from library_core import Library, format_timestamp, now, open_storage
 import streamlit as st
 
-class Library:
-    database = "library-management/data.json"
-    data = {"books": [], "members": []}
+PAGE_SIZES = [10, 25, 50, 100]
+PICKER_SIZE = 20
+FACET_SIZE = 50
+OVERDUE_LIMIT = 200
 
-    # Ensure directory exists
-    Path(database).parent.mkdir(parents=True, exist_ok=True)
 
-    # Load existing data from json or create json
-    if Path(database).exists():
-        with open(database, "r") as f:
-            content = f.read().strip()
-            if content:
-                data = json.loads(content)
-    else:
-        with open(database, "w") as f:
-            json.dump(data, f, indent=4, default=str)
-    
-    @staticmethod
-    def generate_id(prefix="B"):
-        random_id = ""
-        for i in range(5):
-            random_id += random.choice(string.ascii_uppercase + string.digits)
-        return prefix + "-" + random_id
+@st.cache_resource(show_spinner="Loading library...")
+def open_library(database):
+    # Shared by every rerun and session; the storage keeps its counters and
+    # recent-additions heap current on each add, so nothing needs rebuilding
+    return open_storage(database)
 
-    @classmethod
-    def save_data(cls):
-        with open(cls.database, "w") as f:
-            json.dump(cls.data, f, indent=4, default=str)
-    
-    @staticmethod
-    def add_book(title, author, copies):
-        book = {
-            "id": Library.generate_id(),
-            "title": title,
-            "author": author,
-            "available_copies": copies,
-            "total_copies": copies,
-            "added_on": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        Library.data["books"].append(book)
-        Library.save_data()
-        return book["id"]
-    
-    @staticmethod
-    def get_all_books():
-        return Library.data["books"]
 
-    @staticmethod
-    def add_member(name, email):
-        member = {
-            "id": Library.generate_id("M"),
-            "name": name,
-            "email": email,
-            "borrowed": []
-        }
-        Library.data["members"].append(member)
-        Library.save_data()
-        return member["id"]
+# One Library per rerun, all of them over the cached storage
+library = Library(opener=open_library)
 
-    @staticmethod
-    def get_all_members():
-        return Library.data["members"]
 
-    @staticmethod
-    def borrow_book(member_id, book_id):
-        members = [m for m in Library.data["members"] if m["id"] == member_id]
-        if not members:
-            return False, "Member not found"
-        member = members[0]
-        
-        books = [b for b in Library.data["books"] if b["id"] == book_id]
-        if not books:
-            return False, "Book not found"
-        book = books[0]
-        
-        if book["available_copies"] <= 0:
-            return False, "No copies available"
-        
-        borrow_entry = {
-            "book_id": book["id"],
-            "title": book["title"],
-            "borrowed_on": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        member["borrowed"].append(borrow_entry)
-        book['available_copies'] -= 1 
-        Library.save_data()
-        return True, f"Book '{book['title']}' borrowed successfully!"
+def paginate(total, key):
+    # Only one page of widgets is built per rerun, however big the library is
+    col1, col2 = st.columns(2)
+    with col1:
+        page_size = st.selectbox("Per page", PAGE_SIZES, key=f"{key}_page_size")
+    pages = max(1, -(-total // page_size))
+    with col2:
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"{key}_page")
+    return (page - 1) * page_size, page_size
+
+
+def member_picker(label, key, borrowers_only=False):
+    # Matches are looked up as the user types instead of listing every member
+    query = st.text_input(f"🔍 {label} by name, email or ID", key=f"{key}_query")
+    if query:
+        # Non-borrowers are dropped before the limit, not after
+        members = library.search_members(query, PICKER_SIZE, borrowers_only)
+    elif borrowers_only:
+        # Served from the loans, without walking every member
+        members = list(islice(library.get_borrowers(), PICKER_SIZE))
+    else:
+        members = library.page_members(0, PICKER_SIZE)
+    return members
 
-    @staticmethod
-    def return_book(member_id, book_index):
-        members = [m for m in Library.data['members'] if m['id'] == member_id]
-        if not members:
-            return False, "Member not found"
-        
-        member = members[0]
-        
-        if not member['borrowed'] or book_index >= len(member['borrowed']):
-            return False, "Invalid selection"
-        
-        selected = member['borrowed'].pop(book_index)
-        
-        books = [bk for bk in Library.data['books'] if bk['id'] == selected['book_id']]
-        if books:
-            books[0]['available_copies'] += 1
-        
-        Library.save_data()
-        return True, f"Book '{selected['title']}' returned successfully!"
+
+def book_picker(label, key):
+    query = st.text_input(f"🔍 {label} by title, author or ID", key=f"{key}_query")
+    if query:
+        return [b for b in library.search_books(query, PICKER_SIZE) if b.available_copies > 0]
+    # Straight from the in-stock index, no filtering here
+    return library.facet_books(available_only=True, limit=PICKER_SIZE)
+
+
+def author_facet(key):
+    # Authors with their book counts, narrowed down as the user types
+    query = st.text_input("✍️ Filter authors", key=f"{key}_author_query")
+    options = {"All authors": None}
+    for author, count, in_stock in library.author_facets(query, FACET_SIZE):
+        options[f"{author} ({count} books, {in_stock} in stock)"] = author
+    return options[st.selectbox("Author", list(options.keys()), key=f"{key}_author")]
 
 
 def main():
@@ -122,12 +69,15 @@ def main():
     )
     
     st.title("📚 Library Management System")
+    
+    # Pick up changes made by the CLI or another server process
+    library.refresh()
     st.markdown("---")
     
     # Sidebar navigation
     menu = st.sidebar.selectbox(
         "Navigation",
-        ["🏠 Home", "📖 Books", "👥 Members", "📤 Borrow Book", "📥 Return Book"]
+        ["🏠 Home", "📖 Books", "👥 Members", "📤 Borrow Book", "📥 Return Book", "⏰ Overdue"]
     )
     
     if menu == "🏠 Home":
@@ -136,24 +86,24 @@ def main():
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            st.metric("Total Books", len(Library.data["books"]))
+            st.metric("Total Books", library.count_books())
         
         with col2:
-            total_copies = sum(b["total_copies"] for b in Library.data["books"])
+            total_copies = library.total_copies()
             st.metric("Total Copies", total_copies)
         
         with col3:
-            st.metric("Total Members", len(Library.data["members"]))
+            st.metric("Total Members", library.count_members())
         
         st.markdown("---")
         st.subheader("📊 Recent Activity")
         
         # Show recent books
-        if Library.data["books"]:
+        recent_books = library.recent_books(5)
+        if recent_books:
             st.write("**Recently Added Books:**")
-            recent_books = sorted(Library.data["books"], key=lambda x: x["added_on"], reverse=True)[:5]
             for book in recent_books:
-                st.write(f"- {book['title']} by {book['author']} (Added: {book['added_on']})")
+                st.write(f"- {book.title} by {book.author} (Added: {format_timestamp(book.added_on)})")
     
     elif menu == "📖 Books":
         st.header("Book Management")
@@ -161,29 +111,54 @@ def main():
         tab1, tab2 = st.tabs(["📋 View Books", "➕ Add Book"])
         
         with tab1:
-            books = Library.get_all_books()
-            if not books:
+            total_books = library.count_books()
+            if not total_books:
                 st.info("No books in the library yet.")
             else:
-                st.subheader(f"Total Books: {len(books)}")
+                st.subheader(f"Total Books: {total_books}")
+                
+                # Browse by author and availability
+                col1, col2 = st.columns(2)
+                with col1:
+                    author = author_facet("books")
+                with col2:
+                    in_stock = st.checkbox(f"In stock only ({library.count_facet(author, True)} books)")
                 
                 # Search functionality
                 search = st.text_input("🔍 Search books by title or author", "")
                 
                 if search:
-                    books = [b for b in books if search.lower() in b["title"].lower() or search.lower() in b["author"].lower()]
+                    books = [
+                        b for b in library.search_books(search)
+                        if (author is None or b.author == author) and (not in_stock or b.available_copies > 0)
+                    ]
+                    st.caption(f"{len(books)} best match(es)")
+                else:
+                    matching = library.count_facet(author, in_stock)
+                    st.caption(f"{matching} matching book(s)")
+                    offset, limit = paginate(matching, "books")
+                    books = library.facet_books(author, in_stock, offset, limit)
                 
                 for book in books:
-                    with st.expander(f"📕 {book['title']} - {book['author']}"):
+                    with st.expander(f"📕 {book.title} - {book.author}"):
                         col1, col2 = st.columns(2)
                         with col1:
-                            st.write(f"**ID:** {book['id']}")
-                            st.write(f"**Title:** {book['title']}")
-                            st.write(f"**Author:** {book['author']}")
+                            st.write(f"**ID:** {book.id}")
+                            st.write(f"**Title:** {book.title}")
+                            st.write(f"**Author:** {book.author}")
                         with col2:
-                            st.write(f"**Total Copies:** {book['total_copies']}")
-                            st.write(f"**Available:** {book['available_copies']}")
-                            st.write(f"**Added On:** {book['added_on']}")
+                            st.write(f"**Total Copies:** {book.total_copies}")
+                            st.write(f"**Available:** {book.available_copies}")
+                            st.write(f"**Added On:** {format_timestamp(book.added_on)}")
+                        # Which copies are out, from the loan index rather than the members
+                        if book.available_copies < book.total_copies:
+                            st.write("**Out on loan:**")
+                            for member_id, loan in library.loans_for_book(book.id):
+                                member = library.get_member(member_id)
+                                st.write(
+                                    f"- {member.name if member else member_id} ({member_id}), "
+                                    f"borrowed {format_timestamp(loan.borrowed_on)}, due {format_timestamp(loan.due_on)}"
+                                )
         
         with tab2:
             st.subheader("Add New Book")
@@ -195,7 +170,7 @@ def main():
                 submitted = st.form_submit_button("Add Book")
                 if submitted:
                     if title and author:
-                        book_id = Library.add_book(title, author, copies)
+                        book_id = library.add_book(title, author, copies)
                         st.success(f"✓ Book added successfully! ID: {book_id}")
                         st.rerun()
                     else:
@@ -207,21 +182,22 @@ def main():
         tab1, tab2 = st.tabs(["📋 View Members", "➕ Add Member"])
         
         with tab1:
-            members = Library.get_all_members()
-            if not members:
+            total_members = library.count_members()
+            if not total_members:
                 st.info("No members registered yet.")
             else:
-                st.subheader(f"Total Members: {len(members)}")
+                st.subheader(f"Total Members: {total_members}")
                 
-                for member in members:
-                    with st.expander(f"👤 {member['name']} ({member['id']})"):
-                        st.write(f"**Email:** {member['email']}")
-                        st.write(f"**Borrowed Books:** {len(member['borrowed'])}")
+                offset, limit = paginate(total_members, "members")
+                for member in library.page_members(offset, limit):
+                    with st.expander(f"👤 {member.name} ({member.id})"):
+                        st.write(f"**Email:** {member.email}")
+                        st.write(f"**Borrowed Books:** {len(member.borrowed)}")
                         
-                        if member['borrowed']:
+                        if member.borrowed:
                             st.write("**Currently Borrowed:**")
-                            for item in member['borrowed']:
-                                st.write(f"- {item['title']} (Borrowed on: {item['borrowed_on']})")
+                            for item in member.borrowed:
+                                st.write(f"- {item.title} (Borrowed on: {format_timestamp(item.borrowed_on)}, Due: {format_timestamp(item.due_on)})")
         
         with tab2:
             st.subheader("Register New Member")
@@ -232,7 +208,7 @@ def main():
                 submitted = st.form_submit_button("Add Member")
                 if submitted:
                     if name and email:
-                        member_id = Library.add_member(name, email)
+                        member_id = library.add_member(name, email)
                         st.success(f"✓ Member added successfully! ID: {member_id}")
                         st.rerun()
                     else:
@@ -241,30 +217,33 @@ def main():
     elif menu == "📤 Borrow Book":
         st.header("Borrow Book")
         
-        members = Library.get_all_members()
-        books = Library.get_all_books()
-        
-        if not members:
+        if not library.count_members():
             st.warning("No members registered. Please add members first.")
-        elif not books:
+        elif not library.count_books():
             st.warning("No books available. Please add books first.")
         else:
+            members = member_picker("Find member", "borrow_member")
+            available_books = book_picker("Find book", "borrow_book")
+            
             with st.form("borrow_form"):
-                member_options = {f"{m['name']} ({m['id']})": m['id'] for m in members}
+                member_options = {f"{m.name} ({m.id})": m.id for m in members}
                 selected_member = st.selectbox("Select Member*", list(member_options.keys()))
                 
-                available_books = [b for b in books if b['available_copies'] > 0]
-                if not available_books:
-                    st.error("No books available for borrowing.")
+                if not members:
+                    st.error("No matching members.")
+                    st.form_submit_button("Borrow Book", disabled=True)
+                elif not available_books:
+                    st.error("No matching books available for borrowing.")
+                    st.form_submit_button("Borrow Book", disabled=True)
                 else:
-                    book_options = {f"{b['title']} by {b['author']} ({b['id']}) - Available: {b['available_copies']}": b['id'] for b in available_books}
+                    book_options = {f"{b.title} by {b.author} ({b.id}) - Available: {b.available_copies}": b.id for b in available_books}
                     selected_book = st.selectbox("Select Book*", list(book_options.keys()))
                     
                     submitted = st.form_submit_button("Borrow Book")
                     if submitted:
                         member_id = member_options[selected_member]
                         book_id = book_options[selected_book]
-                        success, message = Library.borrow_book(member_id, book_id)
+                        success, message = library.borrow_book(member_id, book_id)
                         
                         if success:
                             st.success(message)
@@ -275,26 +254,36 @@ def main():
     elif menu == "📥 Return Book":
         st.header("Return Book")
         
-        members = Library.get_all_members()
-        members_with_books = [m for m in members if m['borrowed']]
+        members_with_books = member_picker("Find borrower", "return_member", borrowers_only=True)
         
         if not members_with_books:
             st.info("No borrowed books to return.")
         else:
+            member_options = {f"{m.name} ({m.id}) - {len(m.borrowed)} book(s)": m.id for m in members_with_books}
+            selected_member = st.selectbox("Select Member*", list(member_options.keys()))
+            
+            member_id = member_options[selected_member]
+            member = library.get_member(member_id)
+            several = st.checkbox("Return several books at once")
+            
             with st.form("return_form"):
-                member_options = {f"{m['name']} ({m['id']}) - {len(m['borrowed'])} book(s)": m['id'] for m in members_with_books}
-                selected_member = st.selectbox("Select Member*", list(member_options.keys()))
-                
-                member_id = member_options[selected_member]
-                member = [m for m in members if m['id'] == member_id][0]
-                
-                book_options = {f"{i+1}. {b['title']} (Borrowed: {b['borrowed_on']})": i for i, b in enumerate(member['borrowed'])}
-                selected_book = st.selectbox("Select Book to Return*", list(book_options.keys()))
+                # Loans are returned by identity, not position; if the list changed
+                # since it was drawn the selection starts over instead of shifting
+                book_options = {f"{i+1}. {b.title} (Borrowed: {format_timestamp(b.borrowed_on)}, Due: {format_timestamp(b.due_on)})": b for i, b in enumerate(member.borrowed)}
+                if several:
+                    selected_books = st.multiselect("Select Books to Return*", list(book_options.keys()))
+                else:
+                    selected_book = st.selectbox("Select Book to Return*", list(book_options.keys()), index=None)
                 
-                submitted = st.form_submit_button("Return Book")
+                submitted = st.form_submit_button("Return Books" if several else "Return Book")
                 if submitted:
-                    book_index = book_options[selected_book]
-                    success, message = Library.return_book(member_id, book_index)
+                    if several:
+                        # The whole cart is checked and saved in one go
+                        success, message = library.return_many([(member_id, book_options[b]) for b in selected_books])
+                    elif selected_book is None:
+                        success, message = False, "Please select a book to return."
+                    else:
+                        success, message = library.return_book(member_id, book_options[selected_book])
                     
                     if success:
                         st.success(message)
@@ -302,6 +291,24 @@ def main():
                     else:
                         st.error(message)
     
+    elif menu == "⏰ Overdue":
+        st.header("Overdue Loans")
+        
+        today = now()
+        overdue = library.overdue_loans(today, OVERDUE_LIMIT)
+        if not overdue:
+            st.info("No overdue loans. 🎉")
+        else:
+            if len(overdue) == OVERDUE_LIMIT:
+                st.caption(f"Showing the {OVERDUE_LIMIT} longest overdue loans")
+            for member_id, loan in overdue:
+                member = library.get_member(member_id)
+                days_late = (today - loan.due_on) // 86400
+                st.write(
+                    f"- **{loan.title}** ({loan.book_id}) - {member.name if member else member_id} ({member_id}), "
+                    f"due {format_timestamp(loan.due_on)}, {days_late} day(s) late"
+                )
+    
     # Footer
     st.markdown("---")
     st.markdown("Made with ❤️ using Streamlit")
@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import drifted_books, make_title, seed
+from library_core import Library
+
+BACKENDS = [".json", ".jsonl", ".lsnap", ".db"]
+# Catalogue sizes for the benchmarks; the largest only run with --slow
+SIZES = [1_000, 10_000, pytest.param(100_000, marks=pytest.mark.slow)]
+MEMBERS = 200
+
+
+def pytest_addoption(parser):
+    parser.addoption("--slow", action="store_true", help="also run the 100k-book benchmarks")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: large catalogues, skipped unless --slow is given")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--slow"):
+        return
+    skip = pytest.mark.skip(reason="needs --slow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip)
+
+
+def check_copies(storage):
+    # Every copy must be on the shelf or on exactly one loan
+    assert drifted_books(storage) == []
+
+
+@pytest.fixture(params=SIZES)
+def books(request):
+    return request.param
+
+
+@pytest.fixture(params=BACKENDS)
+def database(request, tmp_path, books):
+    # A seeded library in each storage format
+    path = str(tmp_path / f"library{request.param}")
+    seed(path, books, MEMBERS)
+    return path
+
+
+@pytest.fixture
+def library(database):
+    return Library(database)
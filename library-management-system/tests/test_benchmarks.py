@@ -0,0 +1,51 @@
+from itertools import cycle
+
+from conftest import MEMBERS, make_title
+from library_core import open_storage
+
+# pytest tests/ --benchmark-sort=name compares the backends side by side
+
+
+def test_add_book(benchmark, library):
+    count = library.count_books()
+    book_id = benchmark(library.add_book, "Benchmark Book", "Benchmark Author", 2)
+    assert library.get_book(book_id).title == "Benchmark Book"
+    assert library.count_books() > count
+
+
+def test_borrow(benchmark, library, books):
+    pairs = cycle((f"M-{i % MEMBERS:07d}", f"B-{(i * 7919) % books:07d}") for i in range(books))
+
+    def setup():
+        return next(pairs), {}
+
+    benchmark.pedantic(library.borrow_book, setup=setup, rounds=300)
+    assert any(library.get_borrowers())
+
+
+def test_return(benchmark, library, books):
+    pairs = cycle((f"M-{i % MEMBERS:07d}", f"B-{(i * 7919) % books:07d}") for i in range(books))
+
+    def setup():
+        member_id, book_id = next(pairs)
+        assert library.borrow_book(member_id, book_id)[0]
+        return (member_id, library.get_member(member_id).borrowed[0]), {}
+
+    results = []
+    benchmark.pedantic(lambda *args: results.append(library.return_book(*args)), setup=setup, rounds=300)
+    assert all(success for success, message in results)
+    assert not list(library.get_borrowers())
+
+
+def test_search(benchmark, library):
+    # A whole title, a prefix, and a word with the prefix of another
+    words = make_title(42).lower().split()
+    queries = cycle([" ".join(words), words[0][:3], f"{words[1]} {words[2][:2]}"])
+    benchmark(lambda: library.search_books(next(queries)))
+    assert "B-0000042" in [book.id for book in library.search_books(" ".join(words))]
+
+
+def test_load(benchmark, database, books):
+    # Open the library and serve a first lookup
+    book = benchmark(lambda: open_storage(database).get_book(f"B-{books // 2:07d}"))
+    assert book.title == make_title(books // 2)
@@ -0,0 +1,79 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import pytest
+
+from benchmark import stress_worker
+from conftest import BACKENDS, check_copies, seed
+from library_core import Loan, Member, now, open_storage
+
+# Several processes, each with several threads sharing one storage like
+# Streamlit sessions do, all borrowing and returning the same few books
+PROCESSES = 3
+OPERATIONS = 150
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_copies_add_up_after_concurrent_circulation(backend, tmp_path):
+    database = str(tmp_path / f"stress{backend}")
+    seed(database, 10, 30, copies=2)
+
+    # Spawned, not forked: a fork would inherit open SQLite connections from earlier tests
+    worker = partial(stress_worker, members=30, books=10, operations=OPERATIONS)
+    with ProcessPoolExecutor(PROCESSES, mp_context=multiprocessing.get_context("spawn")) as pool:
+        results = list(pool.map(worker, [database] * PROCESSES, range(PROCESSES)))
+
+    assert [error for done, errors in results for error in errors] == []
+    check_copies(open_storage(database))
+
+
+def open_and_count(database, start):
+    # Wait so that every process opens the database at the same moment
+    time.sleep(max(start - time.time(), 0))
+    return open_storage(database).count_books()
+
+
+def test_processes_create_a_new_sqlite_database_at_once(tmp_path):
+    database = str(tmp_path / "library.db")
+    with ProcessPoolExecutor(6, mp_context=multiprocessing.get_context("spawn")) as pool:
+        start = time.time() + 2
+        assert list(pool.map(open_and_count, [database] * 6, [start] * 6)) == [0] * 6
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_sessions_read_while_others_write(backend, tmp_path):
+    # Streamlit sessions share one storage from several threads
+    database = str(tmp_path / f"library{backend}")
+    storage = seed(database, 2_000, 300)
+    for i in range(100):
+        book = storage.get_book(f"B-{i:07d}")
+        storage.borrow(f"M-{i:07d}", Loan(book.id, book.title, now()))
+    storage = open_storage(database)
+    errors = []
+
+    def run(task):
+        try:
+            for i in range(40):
+                task(i)
+        except Exception as e:
+            errors.append(repr(e))
+
+    tasks = [
+        lambda i: list(storage.iter_borrowers()),
+        lambda i: storage.page_books(i * 37, 50),
+        lambda i: storage.page_members(i * 7, 20),
+        lambda i: list(storage.iter_books()),
+        lambda i: storage.add_member(Member(f"M-new-{i:04d}", "New", "new@example.com")),
+    ]
+    threads = [threading.Thread(target=run, args=(task,)) for task in tasks * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(list(storage.iter_borrowers())) == 100
+    assert len(list(storage.iter_members())) == 380
@@ -0,0 +1,161 @@
+import os
+
+import pytest
+
+from conftest import BACKENDS
+from library_core import Book, Library, Member, now
+
+JSON_BACKENDS = [backend for backend in BACKENDS if backend != ".db"]
+
+
+def stamp(path):
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime_ns
+
+
+@pytest.mark.parametrize("backend", JSON_BACKENDS)
+def test_save_without_changes_keeps_snapshot(backend, tmp_path):
+    library = Library(str(tmp_path / f"library{backend}"))
+    library.add_book("Dune", "Frank Herbert", 2)
+    library.save_data()
+    before = stamp(library.database)
+
+    library.save_data()
+    assert stamp(library.database) == before
+
+    library.add_member("Ada", "ada@example.com")
+    library.save_data()
+    assert stamp(library.database) != before
+
+
+def test_sqlite_stats_survive_reopening(tmp_path):
+    database = str(tmp_path / "library.db")
+    library = Library(database)
+    library.add_book("Dune", "Frank Herbert", 2)
+    library.add_member("Ada", "ada@example.com")
+
+    reopened = Library(database)
+    assert (reopened.count_books(), reopened.total_copies(), reopened.count_members()) == (1, 2, 1)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_taken_ids_are_reassigned(backend, tmp_path):
+    # Two processes' views of one library; the second was opened first
+    database = str(tmp_path / f"library{backend}")
+    first = Library(database)
+    first.count_books()
+    second = Library(database)
+    second.count_books()
+
+    book_id = first.add_book("Dune", "Frank Herbert", 2)
+    member_id = first.add_member("Ada", "ada@example.com")
+    clash = Book(book_id, "Emma", "Jane Austen", 1, 1, now())
+    second.storage.add_book(clash)
+    second.storage.add_books([Book(book_id, "Ulysses", "James Joyce", 1, 1, now()), Book(book_id, "Beloved", "Toni Morrison", 1, 1, now())])
+    stranger = Member(member_id, "Bob", "bob@example.com")
+    second.storage.add_member(stranger)
+
+    first.refresh()
+    assert first.get_book(book_id).title == "Dune"
+    assert first.get_book(clash.id).title == "Emma"
+    assert first.count_books() == 4
+    assert len({book.id for book in first.get_all_books()}) == 4
+    assert first.get_member(member_id).name == "Ada"
+    assert first.get_member(stranger.id).name == "Bob"
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_return_checks_the_loan_not_its_position(backend, tmp_path):
+    database = str(tmp_path / f"library{backend}")
+    first = Library(database)
+    member_id = first.add_member("Ada", "ada@example.com")
+    x = first.add_book("Book X", "Author", 1)
+    y = first.add_book("Book Y", "Author", 1)
+    z = first.add_book("Book Z", "Author", 1)
+    for book_id in (x, y, z):
+        assert first.borrow_book(member_id, book_id)[0]
+
+    # The second process lists the loans, then the first returns X
+    second = Library(database)
+    shown = list(second.get_member(member_id).borrowed)
+    assert first.return_book(member_id, first.get_member(member_id).borrowed[0])[0]
+
+    assert second.return_book(member_id, shown[0]) == (False, "Book was already returned")
+    assert not second.return_many([(member_id, shown[0]), (member_id, shown[2])])[0]
+    assert second.return_many([(member_id, shown[2]), (member_id, shown[1])])[0]
+
+    first.refresh()
+    assert first.get_member(member_id).borrowed == []
+    assert [first.get_book(book_id).available_copies for book_id in (x, y, z)] == [1, 1, 1]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_author_facets(backend, tmp_path):
+    library = Library(str(tmp_path / f"library{backend}"))
+    for title, author in [("Emma", "Jane Austen"), ("Persuasion", "Jane Austen"), ("Jane Eyre", "Charlotte Bronte"), ("Ulysses", "James Joyce")]:
+        library.add_book(title, author, 1)
+    member_id = library.add_member("Ada", "ada@example.com")
+
+    assert library.author_facets("ja") == [("Jane Austen", 2, 2), ("James Joyce", 1, 1)]
+    library.borrow_book(member_id, library.search_books("ulysses")[0].id)
+    library.add_book("Dubliners", "James Joyce", 1)
+    library.add_book("Finnegans Wake", "James Joyce", 1)
+    assert library.author_facets("JA") == [("James Joyce", 3, 2), ("Jane Austen", 2, 2)]
+    assert library.author_facets("c") == [("Charlotte Bronte", 1, 1)]
+    assert library.author_facets("x") == []
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_indexes_cover_the_snapshot_and_later_changes(backend, tmp_path):
+    database = str(tmp_path / f"library{backend}")
+    library = Library(database)
+    emma = library.add_book("Emma", "Jane Austen", 1)
+    library.add_book("Persuasion", "Jane Austen", 1)
+    member_id = library.add_member("Ada Lovelace", "ada@example.com")
+    library.save_data()
+
+    # Indexes built after reopening read the snapshot for untouched books
+    # and the current records for changed and new ones
+    reopened = Library(database)
+    assert reopened.borrow_book(member_id, emma)[0]
+    reopened.add_book("Emma in Winter", "Susan Hill", 1)
+    assert sorted(book.title for book in reopened.search_books("emma")) == ["Emma", "Emma in Winter"]
+    assert reopened.author_facets("j") == [("Jane Austen", 2, 1)]
+    assert [book.title for book in reopened.facet_books("Jane Austen", available_only=True)] == ["Persuasion"]
+    assert [member.name for member in reopened.search_members("lovelace")] == ["Ada Lovelace"]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_borrower_search_filters_before_the_limit(backend, tmp_path):
+    library = Library(str(tmp_path / f"library{backend}"))
+    member_ids = [library.add_member(f"Ada {i}", f"ada{i}@example.com") for i in range(30)]
+    book_id = library.add_book("Dune", "Frank Herbert", 2)
+    library.borrow_book(member_ids[-1], book_id)
+
+    assert [m.id for m in library.search_members("ada", 5, borrowers_only=True)] == [member_ids[-1]]
+    assert library.search_members(member_ids[0], 5, borrowers_only=True) == []
+    assert [m.id for m in library.get_borrowers()] == [member_ids[-1]]
+    library.return_book(member_ids[-1], library.get_member(member_ids[-1]).borrowed[0])
+    assert list(library.get_borrowers()) == []
+    assert library.search_members("ada", 5, borrowers_only=True) == []
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_loans_for_book_and_overdue_limit(backend, tmp_path):
+    library = Library(str(tmp_path / f"library{backend}"))
+    dune = library.add_book("Dune", "Frank Herbert", 3)
+    emma = library.add_book("Emma", "Jane Austen", 1)
+    member_ids = [library.add_member(name, f"{name.lower()}@example.com") for name in ("Ada", "Bob", "Cy")]
+    for member_id in member_ids:
+        library.borrow_book(member_id, dune)
+    library.borrow_book(member_ids[0], emma)
+
+    assert sorted(member_id for member_id, loan in library.loans_for_book(dune)) == sorted(member_ids)
+    assert [loan.title for member_id, loan in library.loans_for_book(emma)] == ["Emma"]
+
+    def overdue(limit=None):
+        return [(member_id, loan.book_id, loan.due_on) for member_id, loan in library.overdue_loans(later, limit)]
+
+    later = now() + 30 * 86400
+    assert len(overdue()) == 4
+    assert overdue(2) == overdue()[:2]